@@ -0,0 +1,71 @@
+# This file is part of OMG-tools.
+#
+# OMG-tools -- Optimal Motion Generation-tools
+# Copyright (C) 2016 Ruben Van Parys & Tim Mercy, KU Leuven.
+# All rights reserved.
+#
+# OMG-tools is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+from omgtools import *
+import time
+import matplotlib.pyplot as plt
+import numpy as np
+
+# this file demonstrates the asynchronous deployer: after the first update,
+# a worker process solves the next update while the vehicle executes the
+# latest trajectory, which is replaced as soon as the worker is done
+
+# create vehicle
+vehicle = Holonomic()
+vehicle.set_options({'safety_distance': 0.1})
+vehicle.set_initial_conditions([-1.5, -1.5])
+vehicle.set_terminal_conditions([2., 2.])
+
+# create environment
+environment = Environment(room={'shape': Square(5.)})
+environment.add_obstacle(Obstacle({'position': [0., 0.]}, shape=Circle(0.4)))
+
+# create a point-to-point problem
+problem = Point2point(vehicle, environment, freeT=False)
+problem.init()
+
+# create deployer
+update_time = 0.1
+sample_time = 0.01
+deployer = Deployer(problem, sample_time, update_time, asynchronous=True)
+deployer.reset()
+
+current_state = np.array([-1.5, -1.5])
+state_traj = np.c_[current_state]
+n_samp = int(np.round(update_time/sample_time, 6))
+current_time = 0.
+t00 = time.time()
+while True:
+    trajectories = deployer.update(current_time, current_state)
+    # ideal trajectory following until the next update
+    state_traj = np.c_[state_traj, trajectories['state'][:, 1:n_samp+1]]
+    current_state = state_traj[:, -1]
+    if (np.linalg.norm([2., 2.]-current_state) < 1e-2 or
+            current_time > 20.):
+        break
+    # the next update is due in update_time, the worker solves meanwhile
+    current_time += update_time
+    time.sleep(max(0., t00 + current_time - time.time()))
+deployer.stop()
+print '%d updates, %d solves' % (int(round(current_time/update_time))+1,
+                                 len(problem.update_times))
+
+# plot results
+plt.figure()
+plt.plot(state_traj[0, :], state_traj[1, :])
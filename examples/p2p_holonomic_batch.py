@@ -0,0 +1,53 @@
+# This file is part of OMG-tools.
+#
+# OMG-tools -- Optimal Motion Generation-tools
+# Copyright (C) 2016 Ruben Van Parys & Tim Mercy, KU Leuven.
+# All rights reserved.
+#
+# OMG-tools is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+from omgtools import *
+import matplotlib.pyplot as plt
+
+# this file demonstrates how to plan many point-to-point motions with one
+# problem: the jobs are solved by a pool of worker processes
+
+# create vehicle
+vehicle = Holonomic()
+vehicle.set_options({'safety_distance': 0.1})
+vehicle.set_initial_conditions([-1.5, -1.5])  # dummy: required for problem.init()
+vehicle.set_terminal_conditions([2., 2.])  # dummy: required for problem.init()
+
+# create environment
+environment = Environment(room={'shape': Square(5.)})
+environment.add_obstacle(Obstacle({'position': [0., 0.]}, shape=Circle(0.5)))
+
+# create a point-to-point problem
+problem = Point2point(vehicle, environment, freeT=False)
+problem.set_options({'verbose': 0})
+problem.init()
+
+# jobs: initial state, terminal state and optionally the obstacle states
+jobs = [([-2., -2.], [2., 2.]),
+        ([-2., 2.], [2., -2.]),
+        ([-2., 0.], [2., 0.], [{'position': [0.5, 1.]}]),
+        ([0., -2.], [0., 2.], [{'position': [-1., 0.5]}])]
+results = solve_batch(problem, jobs, processes=2)
+
+# plot results
+plt.figure()
+for job, result in zip(jobs, results):
+    state = result['trajectories']['state']
+    plt.plot(state[0, :], state[1, :])
+    print '%s -> %s: %s' % (job[0], job[1], result['status']['return_status'])
@@ -0,0 +1,67 @@
+# This file is part of OMG-tools.
+#
+# OMG-tools -- Optimal Motion Generation-tools
+# Copyright (C) 2016 Ruben Van Parys & Tim Mercy, KU Leuven.
+# All rights reserved.
+#
+# OMG-tools is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+from omgtools import *
+import numpy as np
+import os
+import tempfile
+
+# this file demonstrates how a solution library warm starts the first update
+# of a point-to-point problem from the nearest solution solved before
+
+# create vehicle
+vehicle = Holonomic()
+vehicle.set_options({'safety_distance': 0.1})
+vehicle.set_initial_conditions([-1.5, -1.5])
+vehicle.set_terminal_conditions([2., 2.])
+
+# create environment
+environment = Environment(room={'shape': Square(5.)})
+rectangle = Rectangle(width=3., height=0.2)
+environment.add_obstacle(Obstacle({'position': [-2.1, -0.5]}, shape=rectangle))
+environment.add_obstacle(Obstacle({'position': [1.7, -0.5]}, shape=rectangle))
+
+# create a point-to-point problem with a library
+library = SolutionLibrary()
+problem = Point2point(vehicle, environment, freeT=False)
+problem.set_options({'verbose': 0, 'library': library})
+problem.init()
+deployer = Deployer(problem)
+
+# solve the first update for initial and terminal states around two routes:
+# the converged solutions are stored in the library
+routes = [([-1.5, -1.5], [2., 2.]), ([1.5, -1.8], [-1.5, 1.5])]
+random = np.random.RandomState(0)
+for k in range(6):
+    initial, terminal = routes[k % 2]
+    vehicle.set_initial_conditions(list(initial + random.uniform(-0.1, 0.1, 2)))
+    vehicle.set_terminal_conditions(list(terminal + random.uniform(-0.1, 0.1, 2)))
+    deployer.reset()
+    deployer.update(0., update_time=np.inf)
+    print 'query %d: %d iterations, %s' % (
+        k, problem.problem.stats()['iter_count'],
+        'no stored solution' if problem.solve_status['library_distance'] is None
+        else 'distance %.2f' % problem.solve_status['library_distance'])
+
+# save the library and load it again
+path = os.path.join(tempfile.gettempdir(), 'p2p_holonomic_library.npz')
+library.save(path)
+library = SolutionLibrary(path)
+print 'loaded %d solutions' % len(library)
+os.remove(path)
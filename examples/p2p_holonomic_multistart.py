@@ -0,0 +1,49 @@
+# This file is part of OMG-tools.
+#
+# OMG-tools -- Optimal Motion Generation-tools
+# Copyright (C) 2016 Ruben Van Parys & Tim Mercy, KU Leuven.
+# All rights reserved.
+#
+# OMG-tools is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+from omgtools import *
+
+# this file demonstrates the multi-start solve of the first update: when the
+# solve from the straight line guess fails, the problem is solved from the
+# path of an A* planner and from paths around each obstacle in parallel
+
+# create vehicle
+vehicle = Holonomic()
+vehicle.set_options({'safety_distance': 0.1})
+vehicle.set_initial_conditions([0., -2.])
+vehicle.set_terminal_conditions([0., 2.])
+
+# create environment: a wall blocks the straight line
+environment = Environment(room={'shape': Square(5.)})
+environment.add_obstacle(Obstacle({'position': [0., 0.]},
+                                  shape=Rectangle(width=3., height=0.2)))
+
+# create a point-to-point problem
+problem = Point2point(vehicle, environment, freeT=True)
+problem.set_options({'multistart': True,
+                     'starts': {'processes': 2, 'race': True}})
+problem.init()
+
+# create simulator
+simulator = Simulator(problem)
+problem.plot('scene')
+vehicle.plot('input', knots=True, labels=['v_x (m/s)', 'v_y (m/s)'])
+
+# run it!
+simulator.run()
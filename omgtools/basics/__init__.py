@@ -1,2 +1,2 @@
-from optilayer import OptiChild, OptiFather
+from optilayer import OptiChild, OptiFather, clear_solver_cache
 from shape import *
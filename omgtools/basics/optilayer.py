@@ -22,16 +22,24 @@ try:
 except:
     from casadi import Importer
     Compiler = Importer
-from casadi import DM, MX, inf, Function, nlpsol, external
-from casadi import symvar, substitute
+from casadi import DM, MX, inf, Function, nlpsol, external, __version__
+from casadi import CodeGenerator, Sparsity, conic, Callback
+from casadi import nlpsol_n_out, nlpsol_out
+from casadi import hessian, jacobian, gradient, dot
+from casadi import symvar, substitute, veccat
 from casadi.tools import struct, struct_MX, struct_symMX, entry
-from spline import BSpline
+from spline import BSpline, SplineSet
 from itertools import groupby
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
 import time
 import numpy as np
-import copy
 import os
+import re
 import shutil
+import hashlib
+import subprocess
+import multiprocessing
 import collections as col
 
 
@@ -44,13 +52,45 @@ def evalf(fun, x):
 # Functions related to c code generation
 # ========================================================================
 
-def create_nlp(var, par, obj, con, options, name=''):
+# structurally identical nlps share their solver
+_nlp_cache = col.OrderedDict()
+_nlp_cache_size = 10
+
+
+def nlp_signature(var, par, obj, con, options):
+    # The generated c code only refers to the stacked variable and parameter
+    # vectors, so it does not depend on the labels of the children, while
+    # constants are written with full precision.
+    generator = CodeGenerator('nlp')
+    generator.add(Function('nlp', [var, par], [obj, con]))
+    hasher = hashlib.sha1(generator.dump().encode())
+    slv_opt = options['solver_options'][options['solver']]
+    codegen = options['codegen']
+    hasher.update(repr([options['solver'], sorted(slv_opt.items()),
+                        codegen['build'], codegen['flags']]).encode())
+    return hasher.hexdigest()
+
+
+def create_nlp(var, par, obj, con, options, name='', callback=None):
     codegen = options['codegen']
     if options['verbose'] >= 1:
         print 'Building nlp ... ',
     t0 = time.time()
+    # a solver with an iteration callback belongs to a single problem
+    reuse = codegen.get('reuse', False) and callback is None
+    if reuse:
+        signature = nlp_signature(var, par, obj, con, options)
+        if signature in _nlp_cache:
+            problem = _nlp_cache.pop(signature)
+            _nlp_cache[signature] = problem  # mark as recently used
+            t1 = time.time()
+            if options['verbose'] >= 1:
+                print '[reusing identical nlp] in %5f s' % (t1-t0)
+            return problem, (t1-t0)
     nlp = {'x': var, 'p': par, 'f': obj, 'g': con}
-    slv_opt = options['solver_options'][options['solver']]
+    slv_opt = dict(options['solver_options'][options['solver']])
+    if callback is not None:
+        slv_opt['iteration_callback'] = callback
     opt = {}
     for key, value in slv_opt.items():
         opt[key] = value
@@ -72,16 +112,17 @@ def create_nlp(var, par, obj, con, options, name=''):
         if not os.path.isdir(directory):
             os.makedirs(directory)
         path = os.path.join(directory, name)
+        flags = compile_flags(codegen, name)
         if options['verbose'] >= 1:
-            print('[compile to .so with flags %s]' % (codegen['flags'])),
-        if os.path.isfile(path+'.so'):
-            os.remove(path+'.so')
-        solver.generate_dependencies(name+'.c')
-        shutil.move(name+'.c', path+'.c')
-        os.system('gcc -fPIC -shared %s %s.c -o %s.so' %
-                  (codegen['flags'], path, path))
+            print('[compile to .so with flags %s]' % (flags)),
+        units = nlp_units(solver, nlp, name)
+        if codegen.get('cache', False):
+            key = [options['solver'],
+                   sorted(options['solver_options'][options['solver']].items())]
+            cached_build(path, units, flags, codegen, key, options['verbose'])
+        else:
+            compile_units(path, units, flags, codegen.get('jobs'))
         problem = nlpsol('solver', options['solver'], path+'.so', slv_opt)
-        os.remove(path+'.c')
     elif codegen['build'] == 'existing':
         if os.name == 'nt':
             raise ValueError('Build option is not supported for Windows!')
@@ -96,6 +137,10 @@ def create_nlp(var, par, obj, con, options, name=''):
         problem = solver
     else:
         raise ValueError('Invalid build option.')
+    if reuse:
+        _nlp_cache[signature] = problem
+        while len(_nlp_cache) > _nlp_cache_size:
+            _nlp_cache.popitem(last=False)
     t1 = time.time()
     if options['verbose'] >= 1:
         print 'in %5f s' % (t1-t0)
@@ -123,16 +168,16 @@ def create_function(name, inp, out, options):
         if not os.path.isdir(directory):
             os.makedirs(directory)
         path = os.path.join(directory, name)
+        flags = compile_flags(codegen, name)
         if options['verbose'] >= 1:
-            print('[compile to .so with flags %s]' % (codegen['flags'])),
-        if os.path.isfile(path+'.so'):
-            os.remove(path+'.so')
-        fun.generate(name+'.c')
-        shutil.move(name+'.c', path+'.c')
-        os.system('gcc -fPIC -shared %s %s.c -o %s.so' %
-                  (codegen['flags'], path, path))
+            print('[compile to .so with flags %s]' % (flags)),
+        units = [(name, generate_source(name, fun))]
+        if codegen.get('cache', False):
+            cached_build(path, units, flags, codegen, ['function'],
+                         options['verbose'])
+        else:
+            compile_units(path, units, flags, codegen.get('jobs'))
         fun = external(name, path+'.so')
-        os.remove(path+'.c')
     elif codegen['build'] == 'existing':
         if os.name == 'nt':
             raise ValueError('Build option is not supported for Windows!')
@@ -153,6 +198,238 @@ def create_function(name, inp, out, options):
     return fun, (t1-t0)
 
 
+class IterationMonitor(Callback):
+    # Iteration callback of the nlp solver: keeps the feasible iterate with
+    # the lowest objective and stops the solver at a wall clock deadline.
+
+    def __init__(self, name, n_var, n_con, n_par):
+        Callback.__init__(self)
+        self.sizes = {'x': n_var, 'lam_x': n_var, 'g': n_con, 'lam_g': n_con,
+                      'f': 1, 'lam_p': n_par}
+        self.start(None, -inf, inf, 0.)
+        self.construct(name, {})
+
+    def start(self, deadline, lb, ub, tol):
+        self.deadline = deadline
+        self.last_iteration = time.time()
+        self.lb, self.ub, self.tol = lb, ub, tol
+        self.best, self.best_objective = None, inf
+
+    def get_n_in(self):
+        return nlpsol_n_out()
+
+    def get_n_out(self):
+        return 1
+
+    def get_name_in(self, i):
+        return nlpsol_out(i)
+
+    def get_name_out(self, i):
+        return 'ret'
+
+    def get_sparsity_in(self, i):
+        name = nlpsol_out(i)
+        if name == 'f':
+            return Sparsity.scalar()
+        return Sparsity.dense(self.sizes[name])
+
+    def eval(self, arg):
+        iterate = dict(zip([nlpsol_out(i) for i in range(nlpsol_n_out())], arg))
+        objective = float(iterate['f'])
+        con = iterate['g'].full().ravel()
+        violation = max(np.max(self.lb - con), np.max(con - self.ub), 0.)
+        if violation <= self.tol and objective < self.best_objective:
+            self.best = iterate['x'].full().ravel()
+            self.best_objective = objective
+        # stop when the next iteration, taking as long as the last one,
+        # would end past the deadline
+        now = time.time()
+        duration, self.last_iteration = now - self.last_iteration, now
+        if self.deadline is not None and now + duration > self.deadline:
+            return [1]  # stops the solver
+        return [0]
+
+
+def create_rti(var, par, obj, con, options, name=''):
+    # A real-time iteration splits the linearization of the nlp: the hessian
+    # of the lagrangian and the constraint jacobian are prepared before the
+    # new state arrives, the gradient and constraint values afterwards. The
+    # step itself is the solution of a qp.
+    rti = options['rti']
+    name = 'rti' if name == '' else 'rti_' + name
+    x, p, g = var.cat, par.cat, con.cat
+    lam = MX.sym('lam_g', g.size1())
+    hess = hessian(obj + dot(lam, g), x)[0]
+    prepare, t_prepare = create_function(
+        name+'_prepare', [x, p, lam], [hess, jacobian(g, x)], options)
+    feedback, t_feedback = create_function(
+        name+'_feedback', [x, p], [gradient(obj, x), g], options)
+    if options['verbose'] >= 1:
+        print 'Building qp ... ',
+    t0 = time.time()
+    # the hessian is convexified before each step, which fills it
+    qp = {'h': Sparsity.dense(x.size1(), x.size1()),
+          'a': prepare.sparsity_out(1)}
+    solver = conic(name+'_qp', rti['qpsol'], qp, rti['qpsol_options'])
+    t1 = time.time()
+    if options['verbose'] >= 1:
+        print 'in %5f s' % (t1-t0)
+    functions = {'prepare': prepare, 'feedback': feedback, 'qp': solver,
+                 'blocks': diagonal_blocks(prepare.sparsity_out(0))}
+    return functions, (t_prepare + t_feedback + t1 - t0)
+
+
+def diagonal_blocks(sparsity):
+    # Split a symmetric sparsity pattern in the index sets of its diagonal
+    # blocks, up to a permutation: the indices of all 1x1 blocks and a list
+    # with the indices of each larger block.
+    row, col = sparsity.get_triplet()
+    pattern = csr_matrix((np.ones(len(row)), (row, col)), shape=sparsity.shape)
+    n_blocks, labels = connected_components(pattern, directed=False)
+    blocks = [np.where(labels == k)[0] for k in range(n_blocks)]
+    single = np.array([b[0] for b in blocks if len(b) == 1], dtype=int)
+    return {'single': single, 'coupled': [b for b in blocks if len(b) > 1]}
+
+
+# ========================================================================
+# Parallel and incremental compilation of shared objects
+# ========================================================================
+
+def generate_source(name, fun):
+    generator = CodeGenerator(name)
+    generator.add(fun)
+    return generator.dump()
+
+
+def nlp_units(solver, nlp, name):
+    # Split the solver in one translation unit per function. Every unit has
+    # its own prefix, so they can be compiled separately and linked together.
+    solver.generate_dependencies(name+'.c')
+    with open(name+'.c') as f:
+        source = f.read()
+    os.remove(name+'.c')
+    units = []
+    for fun_name in re.findall(r'^int (\w+)\(const real_t\*\* arg', source, re.M):
+        if fun_name == 'nlp':
+            fun = Function('nlp', [nlp['x'], nlp['p']], [nlp['f'], nlp['g']],
+                           ['x', 'p'], ['f', 'g']).expand()
+        elif solver.has_function(fun_name):
+            fun = solver.get_function(fun_name)
+        else:
+            return [(name, source)]  # compile as a whole
+        unit = name + '_' + fun_name
+        units.append((unit, generate_source(unit, fun)))
+    return units
+
+
+def compile_flags(codegen, name):
+    # flags per function, e.g. {'nlp': '-O3', 'upd_z': '-O1'}, matching the
+    # function name with or without its index
+    function_flags = codegen.get('function_flags') or {}
+    for key in sorted(function_flags.keys(), key=len, reverse=True):
+        if name == key or name.startswith(key+'_'):
+            return function_flags[key]
+    return codegen['flags']
+
+
+def compile_units(path, units, flags, jobs=None, target=None):
+    # Compile the units in parallel to object files, kept in a directory next
+    # to the shared object. Units of which the source and flags did not change
+    # since the previous build are not recompiled.
+    jobs = jobs or multiprocessing.cpu_count()
+    target = target or path+'.so'
+    directory = path + '_units'
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    objects, commands = [], []
+    for unit, source in units:
+        source = '/* flags: %s */\n' % flags + source
+        src = os.path.join(directory, unit+'.c')
+        obj = os.path.join(directory, unit+'.o')
+        objects.append(obj)
+        if os.path.isfile(obj) and os.path.isfile(src):
+            with open(src) as f:
+                if f.read() == source:
+                    continue
+        with open(src, 'w') as f:
+            f.write(source)
+        if os.path.isfile(obj):
+            os.remove(obj)
+        commands.append('gcc -fPIC -c %s %s -o %s' % (flags, src, obj))
+    processes, failed = [], False
+    for command in commands:
+        if len(processes) >= jobs:
+            failed |= (processes.pop(0).wait() != 0)
+        processes.append(subprocess.Popen(command, shell=True))
+    for process in processes:
+        failed |= (process.wait() != 0)
+    if failed or not all(os.path.isfile(obj) for obj in objects):
+        raise ValueError('Compilation of %s failed!' % path)
+    if commands or not os.path.isfile(target):
+        # link to a new file: a loaded object may not be overwritten in place
+        tmp = '%s.%d.tmp' % (target, os.getpid())
+        if subprocess.call('gcc -shared %s -o %s' %
+                           (' '.join(objects), tmp), shell=True) != 0:
+            raise ValueError('Linking of %s failed!' % target)
+        os.rename(tmp, target)
+
+
+# ========================================================================
+# Persistent cache of compiled shared objects
+# ========================================================================
+
+def solver_cache_dir(codegen=None):
+    codegen = codegen or {}
+    if codegen.get('cache_dir') is not None:
+        return codegen['cache_dir']
+    return os.path.join(os.path.expanduser('~'), '.omgtools', 'cache')
+
+
+def clear_solver_cache(codegen=None):
+    directory = solver_cache_dir(codegen)
+    if os.path.isdir(directory):
+        shutil.rmtree(directory)
+
+
+def cached_build(path, units, flags, codegen, key, verbose=0):
+    # The generated c code is a canonical serialization of the expression
+    # graph. Together with the compiler flags, the casadi version and the
+    # extra key (solver name and options), it addresses the compiled object.
+    hasher = hashlib.sha1()
+    for unit, source in units:
+        hasher.update(source.encode())
+    hasher.update(repr([flags, __version__, key]).encode())
+    directory = solver_cache_dir(codegen)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    cached = os.path.join(directory, hasher.hexdigest()+'.so')
+    if os.path.isfile(cached):
+        if verbose >= 1:
+            print('[cache hit]'),
+        os.utime(cached, None)  # mark as recently used
+    else:
+        # objects are linked to a temporary file and moved in place
+        # atomically, so concurrent processes never load a partial object
+        compile_units(path, units, flags, codegen.get('jobs'), cached)
+        prune_solver_cache(codegen)
+    tmp = '%s.%d.tmp' % (path, os.getpid())
+    shutil.copy(cached, tmp)
+    os.rename(tmp, path+'.so')
+
+
+def prune_solver_cache(codegen=None):
+    # remove least recently used objects when exceeding the cache size
+    directory = solver_cache_dir(codegen)
+    size = (codegen or {}).get('cache_size', 20)
+    if not os.path.isdir(directory):
+        return
+    files = [os.path.join(directory, f) for f in os.listdir(directory)
+             if f.endswith('.so')]
+    files.sort(key=os.path.getmtime, reverse=True)
+    for f in files[size:]:
+        os.remove(f)
+
+
 class OptiFather(object):
 
     def __init__(self, children=None):
@@ -176,37 +453,91 @@ class OptiFather(object):
     # ========================================================================
 
     def construct_problem(self, options, name='', problem=None):
+        self.construct_times = col.OrderedDict()
+        t0 = time.time()
         self.compose_dictionary()
         self.translate_symbols()
+        t0 = self._lap('symbols', t0)
         variables = self.construct_variables()
         parameters = self.construct_parameters()
+        t0 = self._lap('structs', t0)
+        self.substitute_symbols(variables, parameters)
+        t0 = self._lap('substitution', t0)
         self.construct_substitutes(variables, parameters)
+        t0 = self._lap('substitutes', t0)
         constraints, _, _ = self.construct_constraints(variables, parameters)
+        t0 = self._lap('constraints', t0)
         objective = self.construct_objective(variables, parameters)
+        t0 = self._lap('objective', t0)
         self.problem_description = {'var': variables, 'par': parameters,
                                     'obj': objective, 'con': constraints,
                                     'opt': options}
+        self._constraint_fun = None
+        self._stationarity_fun = None
+        self.monitor = None
+        if options.get('deadline') is not None:
+            self.monitor = IterationMonitor('monitor', variables.size,
+                                            constraints.size, parameters.size)
         if problem is None:
             problem, buildtime = create_nlp(variables, parameters, objective,
-                constraints, options, name)
+                constraints, options, name, self.monitor)
         else:
             buildtime = 0.
+        t0 = self._lap('nlp', t0)
         self.init_variables()
         self.init_parameters()
+        self._lap('initialization', t0)
+        if options.get('profile', False):
+            print 'Construction times:'
+            for phase, duration in self.construct_times.items():
+                print '  %-15s %5f s' % (phase, duration)
         return problem, buildtime
 
+    def construct_rti(self, options, name=''):
+        description = self.problem_description
+        return create_rti(description['var'], description['par'],
+                          description['obj'], description['con'], options, name)
+
+    def constraint_violation(self, variables, parameters, lb, ub):
+        if self._constraint_fun is None:
+            description = self.problem_description
+            self._constraint_fun = Function('constraints',
+                [description['var'], description['par']],
+                [description['con']]).expand()
+        con = np.array(self._constraint_fun(variables, parameters)).ravel()
+        return max(np.max(lb - con), np.max(con - ub), 0.)
+
+    def stationarity(self, variables, parameters, duals, bound_duals):
+        # largest entry of the gradient of the lagrangian, zero in an optimum
+        if self._stationarity_fun is None:
+            description = self.problem_description
+            var, par = description['var'].cat, description['par'].cat
+            con = description['con'].cat
+            lam_g = MX.sym('lam_g', con.size1())
+            lam_x = MX.sym('lam_x', var.size1())
+            lag = description['obj'] + dot(lam_g, con)
+            self._stationarity_fun = Function('stationarity',
+                [var, par, lam_g, lam_x], [gradient(lag, var) + lam_x]).expand()
+        grad = self._stationarity_fun(variables, parameters, duals, bound_duals)
+        return np.max(np.abs(np.array(grad)))
+
+    def _lap(self, phase, t0):
+        t1 = time.time()
+        self.construct_times[phase] = t1 - t0
+        return t1
+
     def compose_dictionary(self):
         for child in self.children.values():
             self.symbol_dict.update(child.symbol_dict)
 
     def translate_symbols(self):
+        definitions = {}
+        for child in self.children.values():
+            for name in set(child._variables.keys() + child._parameters.keys()):
+                definitions.setdefault(name, []).append(child)
         for label, child in self.children.items():
             for name, symbol in child._symbols.items():
-                sym_def = []
-                for _, _child in self.children.items():
-                    if (name in _child._variables or
-                            name in _child._parameters):
-                        sym_def.append(_child)
+                sym_def = definitions.get(name, [])
                 if len(sym_def) > 1:
                     raise ValueError('Symbol %s, defined in %s, is defined'
                                      ' multiple times as parameter or'
@@ -228,6 +559,13 @@ class OptiFather(object):
                 entries_child.append(entry(name, shape=var.shape))
             entries.append(entry(label, struct=struct(entries_child)))
         self._var_struct = struct(entries)
+        # offsets of each variable in the flat variable vector, in the shape
+        # of the variable
+        self._var_index = col.OrderedDict()
+        for label, child in self.children.items():
+            for name, var in child._variables.items():
+                self._var_index[label, name] = np.array(
+                    self._var_struct.f[label, name]).reshape(var.shape, order='F')
         return struct_symMX(self._var_struct)
 
     def construct_parameters(self):
@@ -238,23 +576,59 @@ class OptiFather(object):
                 entries_child.append(entry(name, shape=par.shape))
             entries.append(entry(label, struct=struct(entries_child)))
         self._par_struct = struct(entries)
+        # flat parameter vector, with the offsets of each parameter
+        self._par_vec = np.zeros(self._par_struct.size)
+        self._par_index = col.OrderedDict()
+        for label, child in self.children.items():
+            for name in child._parameters.keys():
+                self._par_index[label, name] = np.array(
+                    self._par_struct.f[label, name])
+        self._par_result = None
+        self._par_fixed = None
         return struct_symMX(self._par_struct)
 
+    def substitute_symbols(self, variables, parameters):
+        # collect the expressions of all children and replace their symbols
+        # by the problem variables and parameters in a single pass
+        keys, expressions = [], []
+        for child in self.children.values():
+            for name, subst in child._substitutes.items():
+                keys.append((child, 'substitute', name))
+                expressions.append(subst[0])
+            for name, constraint in child._constraints.items():
+                keys.append((child, 'constraint', name))
+                expressions.append(constraint[0])
+            if not isinstance(child._objective, (int, float)):
+                keys.append((child, 'objective', None))
+                expressions.append(child._objective)
+        expressions = [MX(expr) for expr in expressions]
+        symbols, definitions = [], []
+        if expressions:
+            for sym in symvar(veccat(*expressions)):
+                [child, name] = self.symbol_dict[sym.name()]
+                if name in child._variables:
+                    symbols.append(sym)
+                    definitions.append(variables[child.label, name])
+                elif name in child._parameters:
+                    symbols.append(sym)
+                    definitions.append(parameters[child.label, name])
+        if symbols:
+            expressions = substitute(expressions, symbols, definitions)
+        self._expressions = dict(zip(keys, expressions))
+
     def construct_substitutes(self, variables, parameters):
         self.substitutes = {}
         for child in self.children.values():
             self.substitutes[child] = {}
-            for name, subst in child._substitutes.items():
-                expr, _ = subst
-                expression = self._substitute_symbols(expr, variables, parameters)
+            for name in child._substitutes.keys():
+                expression = self._expressions[child, 'substitute', name]
                 self.substitutes[child][name] = Function(name, [variables, parameters], [expression])
 
     def construct_constraints(self, variables, parameters):
         entries = []
         for child in self.children.values():
-            for name, constraint in child._constraints.items():
-                expression = self._substitute_symbols(
-                    constraint[0], variables, parameters)
+            for name in child._constraints.keys():
+                expression = self._expressions[child, 'constraint', name]
                 entries.append(entry(child._add_label(name), expr=expression))
         self._con_struct = struct(entries)
         constraints = struct_MX(entries)
@@ -267,13 +641,25 @@ class OptiFather(object):
                 if constraint[3]:
                     self._constraint_shutdown[
                         child._add_label(name)] = constraint[3]
+        self.compile_bounds()
         return constraints, self._lb, self._ub
 
+    def compile_bounds(self):
+        # flat bounds, with the indices of the constraints that can be shut
+        # down grouped per (once compiled) shutdown condition
+        self._lb_vec = np.array(self._lb.cat).ravel()
+        self._ub_vec = np.array(self._ub.cat).ravel()
+        indices = col.OrderedDict()
+        for name, shutdown in self._constraint_shutdown.items():
+            indices.setdefault(shutdown, []).extend(self._con_struct.f[name])
+        self._shutdown = [(eval('lambda t: %s' % shutdown), np.array(ind))
+                          for shutdown, ind in indices.items()]
+
     def construct_objective(self, variables, parameters):
         objective = 0.
         for child in self.children.values():
-            objective += self._substitute_symbols(
-                child._objective, variables, parameters)
+            if (child, 'objective', None) in self._expressions:
+                objective += self._expressions[child, 'objective', None]
         return objective
 
     def reset(self):
@@ -309,11 +695,10 @@ class OptiFather(object):
     # ========================================================================
 
     def update_bounds(self, current_time):
-        lb, ub = copy.deepcopy(self._lb), copy.deepcopy(self._ub)
-        for name, shutdown in self._constraint_shutdown.items():
-            exec('shutdown_fun = lambda t: %s' % shutdown)
+        lb, ub = self._lb_vec.copy(), self._ub_vec.copy()
+        for shutdown_fun, indices in self._shutdown:
             if shutdown_fun(current_time):
-                lb[name], ub[name] = -inf, +inf
+                lb[indices], ub[indices] = -inf, +inf
         return lb, ub
 
     def init_variables(self):
@@ -323,6 +708,7 @@ class OptiFather(object):
                 variables[label, name] = child._values[name]
         self._var_result = variables
         self._dual_var_result = self._con_struct(0.)
+        self._bound_dual_var_result = self._var_struct(0.)
 
     def init_parameters(self):
         self.set_parameters(0.)
@@ -343,6 +729,12 @@ class OptiFather(object):
         else:
             self._dual_var_result[child.label, name] = variables
 
+    def set_bound_dual_variables(self, variables):
+        self._bound_dual_var_result = self._var_struct(variables)
+
+    def get_bound_dual_variables(self):
+        return self._bound_dual_var_result
+
     def get_variables(self, child=None, name=None, **kwargs):
         if child is None:
             return self._var_result
@@ -359,7 +751,7 @@ class OptiFather(object):
                             coeffs = child._substitutes[name][0]
                     else:
                         fun = self.substitutes[child][name]
-                        coeffs = np.array(fun(self._var_result, self._par_result))
+                        return SplineSet(basis, np.array(fun(self._var_result, DM(self._par_vec))))
                     return [BSpline(basis, coeffs[:, k]) for k in range(coeffs.shape[1])]
                 else:
                     if 'symbolic' in kwargs and kwargs['symbolic']:
@@ -369,13 +761,13 @@ class OptiFather(object):
                             return child._substitutes[name][0]
                     else:
                         fun = self.substitutes[child][name]
-                        return np.array(fun(self._var_result, self._par_result))
+                        return np.array(fun(self._var_result, DM(self._par_vec)))
             if name in child._splines_prim and not ('spline' in kwargs and not kwargs['spline']):
                 basis = child._splines_prim[name]['basis']
                 if 'symbolic' in kwargs and kwargs['symbolic']:
                     coeffs = child._variables[name]
                 else:
-                    coeffs = np.array(self._var_result[child.label, name])
+                    return SplineSet(basis, np.array(self._var_result[child.label, name]))
                 return [BSpline(basis, coeffs[:, k]) for k in range(coeffs.shape[1])]
             else:
                 if 'symbolic' in kwargs and kwargs['symbolic']:
@@ -391,39 +783,62 @@ class OptiFather(object):
 
     def get_parameters(self, child=None, name=None, **kwargs):
         if child is None:
-            return self._par_result
+            return self.parameter_struct()
         elif name is None:
-            return self._par_result.prefix(child.label)
+            return self.parameter_struct().prefix(child.label)
         else:
             if name in child._splines_prim and not ('spline' in kwargs and not kwargs['spline']):
                 basis = child._splines_prim[name]['basis']
                 if 'symbolic' in kwargs and kwargs['symbolic']:
                     coeffs = child._parameters[name]
                 else:
-                    coeffs = np.array(self._par_result[child.label, name])
+                    coeffs = np.array(self.parameter_struct()[child.label, name])
                 return [BSpline(basis, coeffs[:, k]) for k in range(coeffs.shape[1])]
             else:
                 if 'symbolic' in kwargs and kwargs['symbolic']:
                     return child._parameters[name]
                 else:
-                    return np.array(self._par_result[child.label, name])
+                    return np.array(self.parameter_struct()[child.label, name])
 
     def get_constraint(self, child, name, symbolic=False):
         if symbolic:
             return child._constraints[name][0]
         else:
             return self._evaluate_symbols(self.children[child.label]._constraints[name][0],
-                self._var_result, self._par_result)
+                self._var_result, self.parameter_struct())
 
     def get_objective(self, child, name, symbolic=False):
         if symbolic:
             return child._objective
         else:
             return self._evaluate_symbols(self.children[child.label]._objective,
-                self._var_result, self._par_result)
+                self._var_result, self.parameter_struct())
+
+    def parameter_index(self, child, name):
+        # offsets of a parameter in the flat parameter vector
+        return self._par_index[child.label, name]
+
+    def fix_parameters(self, values):
+        # Parameter values evaluated elsewhere, e.g. by the process that owns
+        # the simulated vehicles and obstacles. set_parameters returns them
+        # until they are released with None.
+        self._par_fixed = None if values is None else np.array(values, dtype=float).ravel()
+
+    def parameter_struct(self):
+        # the parameter struct is only built when parameters are indexed by
+        # name, the solvers take the flat parameter vector
+        if self._par_result is None:
+            self._par_result = self._par_struct(DM(self._par_vec))
+        return self._par_result
 
     def set_parameters(self, time):
-        self._par_result = self._par_struct(0.)
+        # writes the parameters in place in the flat parameter vector and
+        # returns it as DM
+        if self._par_fixed is not None:
+            if not np.array_equal(self._par_vec, self._par_fixed):
+                self._par_vec[:] = self._par_fixed
+                self._par_result = None
+            return DM(self._par_vec)
         parameters = {}
         for label, child in self.children.items():
             par = child.set_parameters(time)
@@ -434,13 +849,17 @@ class OptiFather(object):
                     if key in parameters[chld]:
                         raise ValueError('Same parameter set multiple times!')
                 parameters[chld].update(par[chld])
+        # write the values in the parameter vector, in column-major order
         for label, child in self.children.items():
             for name in child._parameters.keys():
                 if child in parameters and name in parameters[child]:
-                    self._par_result[label, name] = parameters[child][name]
+                    value = parameters[child][name]
                 else:
-                    self._par_result[label, name] = child._values[name]
-        return self._par_result
+                    value = child._values[name]
+                self._par_vec[self._par_index[label, name]] = np.ravel(
+                    value, order='F')
+        self._par_result = None
+        return DM(self._par_vec)
 
     # ========================================================================
     # Spline tranformations
@@ -473,32 +892,57 @@ class OptiFather(object):
         elif not isinstance(seg_shift, list):
             # should be an index list
             seg_shift = [seg_shift]
+        # splines with the same basis are transformed in one matrix product
+        blocks = col.OrderedDict()
         for label, child in self.children.items():
             for name, spl in child._splines_prim.items():
                 if name in child._variables:
                     # check if n in 'segn' is in the index list of segments to shift
                     if ('seg' in name and int(name[name.index('seg')+3]) in seg_shift):
-                        basis = spl['basis']
-                        init = spl['init']
-                        if init is not None:
-                            self._var_result[label, name] = transform_fun(
-                                self._var_result[label, name], basis, init)
-                        else:
-                            self._var_result[label, name] = transform_fun(
-                                self._var_result[label, name], basis)
+                        if spl['basis'] not in blocks:
+                            blocks[spl['basis']] = (spl['init'], [])
+                        blocks[spl['basis']][1].append((label, name))
+        # work on the flat vectors, indexing the structures is slow
+        var = np.array(self._var_result.cat).ravel()
+        bound_dual = np.array(self._bound_dual_var_result.cat).ravel()
+        for basis, (init, entries) in blocks.items():
+            indices = [self._var_index[label, name] for label, name in entries]
+            coeffs = np.hstack([vec[index] for index in indices
+                                for vec in [var, bound_dual]])
+            if init is not None:
+                coeffs = transform_fun(coeffs, basis, init)
+            else:
+                coeffs = transform_fun(coeffs, basis)
+            coeffs = np.array(coeffs)
+            k = 0
+            for index in indices:
+                for vec in [var, bound_dual]:
+                    vec[index] = coeffs[:, k:k+index.shape[1]]
+                    k += index.shape[1]
+        self._var_result = self._var_struct(DM(var))
+        self._bound_dual_var_result = self._var_struct(DM(bound_dual))
 
     def transform_dual_splines(self, transform_fun):
         for label, child in self.children.items():
             for name, spl in child._splines_dual.items():
+                con_name = child._add_label(name)
                 basis = spl['basis']
                 init = spl['init']
-                if init is not None:
-                    init = spl['init']
-                    self._dual_var_result[label, name] = transform_fun(
-                        self._dual_var_result[label, name], basis, init)
+                dual = np.array(self._dual_var_result[con_name])
+                if dual.shape[0] != len(basis):
+                    # coefficients were skipped: no consistent shift
+                    self._dual_var_result[con_name] = 0.
+                elif init is not None:
+                    self._dual_var_result[con_name] = transform_fun(
+                        dual, basis, init)
                 else:
-                    self._dual_var_result[label, name] = transform_fun(
-                        self._dual_var_result[label, name], basis)
+                    self._dual_var_result[con_name] = transform_fun(
+                        dual, basis)
+        # multipliers of one-sided constraints keep their sign
+        dual = np.array(self._dual_var_result.cat).ravel()
+        dual[np.isinf(self._lb_vec)] = np.maximum(dual[np.isinf(self._lb_vec)], 0.)
+        dual[np.isinf(self._ub_vec)] = np.minimum(dual[np.isinf(self._ub_vec)], 0.)
+        self._dual_var_result = self._con_struct(DM(dual))
 
 
 class OptiChild(object):
@@ -22,46 +22,142 @@ import functools
 import numpy as np
 import scipy.linalg as la
 import casadi as cas
-from scipy.sparse import csr_matrix
+from scipy.sparse import csr_matrix, diags, identity, kron
+from scipy.special import comb
+from scipy.sparse.linalg import splu
 # from piecewise import PiecewisePolynomial as ppoly
 # from scipy.sparse.linalg import spsolve
-from collections import Counter
-import md5
+from collections import Counter, OrderedDict
 
 NO_POINTS = 501
+# maximum number of entries in the caches of memoize and cached_class
+MEMOIZE_SIZE = 512
+CLASS_CACHE_SIZE = 1024
 
+_caches = OrderedDict()
 
-def memoize(f):
-    """ Memoization decorator"""
-    class memodict(dict):
-        def __init__(self, f):
-            self.f = f
 
-        def __call__(self, *args):
-            key = (args[0], md5.new(np.atleast_1d(args[1])).digest())
-            if key in self:
-                return self[key]
-            else:
-                ret = self[key] = self.f(*args)
-                return ret
+class LRUCache(object):
+    """A dictionary-like cache with a bounded number of entries.
+
+    When the cache is full, the least recently used entry is evicted. The
+    number of hits, misses and evictions is counted, see info().
+    """
+    def __init__(self, maxsize=None):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self.hits, self.misses, self.evictions = 0, 0, 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        try:
+            value = self._data.pop(key)
+        except KeyError:
+            self.misses += 1
+            return default
+        self._data[key] = value  # mark as most recently used
+        self.hits += 1
+        return value
+
+    def __setitem__(self, key, value):
+        self._data.pop(key, None)
+        self._data[key] = value
+        self._evict()
+
+    def _evict(self):
+        while self.maxsize is not None and len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def resize(self, maxsize):
+        self.maxsize = maxsize
+        self._evict()
+
+    def clear(self):
+        self._data.clear()
+        self.hits, self.misses, self.evictions = 0, 0, 0
+
+    def info(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'size': len(self._data),
+                'maxsize': self.maxsize}
+
+
+def _register_cache(name, maxsize):
+    cache = LRUCache(maxsize)
+    _caches[name] = cache
+    return cache
+
+
+def cache_info():
+    """Return the statistics of the spline caches, indexed by name"""
+    return dict((name, cache.info()) for name, cache in _caches.items())
+
 
-        def __get__(self, obj, objtype):
-            return functools.partial(self.__call__, obj)
-    return memodict(f)
+def set_cache_size(maxsize, name=None):
+    """Set the maximum number of entries of one (or all) spline caches.
+    Use maxsize=None for an unbounded cache."""
+    names = _caches.keys() if name is None else [name]
+    for name in names:
+        _caches[name].resize(maxsize)
+
+
+def clear_caches():
+    for cache in _caches.values():
+        cache.clear()
+
+
+def _make_key(arg):
+    """Return a cheap hashable key for a numeric (array) argument"""
+    if isinstance(arg, (int, long, float, Basis)):
+        return arg
+    arg = np.asarray(arg)
+    if arg.dtype == object:
+        raise TypeError('Can not make a key for an object array')
+    return (arg.dtype.char, arg.shape, arg.tobytes())
+
+
+def memoize(f):
+    """Memoization decorator for methods with numeric or basis arguments.
+    The results are kept in a bounded LRU cache."""
+    cache = _register_cache(f.__name__, MEMOIZE_SIZE)
+    missing = object()
+
+    @functools.wraps(f)
+    def memoized(self, *args, **kwds):
+        try:
+            key = ((self,) + tuple([_make_key(a) for a in args]) +
+                   tuple(sorted(kwds.iteritems())))
+            hash(key)
+        except TypeError:  # Can't cache these arguments
+            return f(self, *args, **kwds)
+        ret = cache.get(key, missing)
+        if ret is missing:
+            ret = cache[key] = f(self, *args, **kwds)
+        return ret
+    memoized.cache = cache
+    return memoized
 
 
 def cached_class(klass):
     """Decorator to cache class instances by constructor arguments.
+    The instances are kept in a bounded LRU cache.
     """
-    cache = {}
+    cache = _register_cache(klass.__name__, CLASS_CACHE_SIZE)
 
     @functools.wraps(klass, assigned=('__name__', '__module__'), updated=())
     class _decorated(klass):
         __doc__ = klass.__doc__
 
         def __new__(cls, *args, **kwds):
-            key = (cls,) + tuple([md5.new(np.atleast_1d(k)).digest() for k in args]) + tuple(kwds.iteritems())
             try:
+                key = ((cls,) + tuple([_make_key(k) for k in args]) +
+                       tuple(sorted(kwds.iteritems())))
                 inst = cache.get(key, None)
             except TypeError:  # Can't cache this set of arguments
                 inst = key = None
@@ -75,6 +171,7 @@ def cached_class(klass):
         def __init__(self, *args, **kwds):
             pass
 
+    _decorated.cache = cache
     return _decorated
 
 
@@ -92,7 +189,10 @@ class csr_matrix_alt(csr_matrix):
     def dot(self, other):
         if isinstance(other, (cas.MX, cas.SX)):
             # compatible with casadi 3.0 -- added by ruben
-            return cas.mtimes(cas.DM(csr_matrix(self)), other)
+            # the DM conversion is kept, as cached operators are reused often
+            if getattr(self, '_dm', None) is None:
+                self._dm = cas.DM(csr_matrix(self))
+            return cas.mtimes(self._dm, other)
             # NOT COMPATIBLE WITH CASADI 2.4
             # return cas.DMatrix(csr_matrix(self)).mul(other)
         elif get_module(other) in ['cvxpy', 'cvxopt']:
@@ -109,6 +209,83 @@ class csr_matrix_alt(csr_matrix):
                 return np.dot(self.toarray(), other)
 
 
+def _subdivide(ctrl):
+    """Split Bezier pieces at their midpoint (de Casteljau algorithm)"""
+    left, right = [ctrl[:, 0]], [ctrl[:, -1]]
+    while ctrl.shape[1] > 1:
+        ctrl = 0.5 * (ctrl[:, :-1] + ctrl[:, 1:])
+        left.append(ctrl[:, 0])
+        right.append(ctrl[:, -1])
+    return np.column_stack(left), np.column_stack(right[::-1])
+
+
+def bernstein_roots(ctrl, lo, hi, tol=1e-12, scale=None):
+    """Return the roots of polynomial pieces in Bernstein form
+
+    Row i of ctrl contains the Bernstein coefficients of a polynomial on
+    [lo[i], hi[i]]. All pieces are subdivided simultaneously. Parts for which
+    the convex hull of the coefficients does not contain zero are pruned,
+    until the remaining parts are smaller than tol times their piece. The
+    hull is widened by the round-off level, relative to scale[i] (default:
+    the largest coefficient of the piece), so roots on the boundary of a
+    piece or where the polynomial touches zero are kept. Parts on which the
+    polynomial is below the round-off level are not subdivided any further.
+
+    Returns:
+        (numpy.array, numpy.array): piece index and location of the roots,
+            sorted by piece index and location
+    """
+    ctrl = np.atleast_2d(np.array(ctrl, dtype=float))
+    lo, hi = np.asarray(lo, dtype=float), np.asarray(hi, dtype=float)
+    # identically zero pieces have no isolated roots
+    if scale is None:
+        scale = np.abs(ctrl).max(axis=1)
+    atol = 8*np.finfo(float).eps*np.broadcast_to(scale, len(ctrl))
+    piece = np.where(np.any(ctrl != 0., axis=1))[0]
+    ctrl = ctrl[piece]
+    a, b = np.zeros(len(piece)), np.ones(len(piece))
+    pieces, roots = [], []
+    while len(piece):
+        atol_p = atol[piece]
+        keep = (ctrl.min(axis=1) <= atol_p) & (ctrl.max(axis=1) >= -atol_p)
+        done = keep & ((b - a <= tol) | (np.abs(ctrl).max(axis=1) <= atol_p))
+        pieces.append(piece[done])
+        roots.append(lo[piece[done]] +
+                     (hi - lo)[piece[done]] * 0.5 * (a[done] + b[done]))
+        keep &= ~done
+        piece, ctrl, a, b = piece[keep], ctrl[keep], a[keep], b[keep]
+        left, right = _subdivide(ctrl)
+        mid = 0.5 * (a + b)
+        piece = np.r_[piece, piece]
+        ctrl = np.r_[left, right]
+        a, b = np.r_[a, mid], np.r_[mid, b]
+    pieces, roots = np.concatenate(pieces), np.concatenate(roots)
+    order = np.lexsort((roots, pieces))
+    return pieces[order], roots[order]
+
+
+def unique_roots(roots, tol):
+    """Merge sorted roots which lie closer than tol to each other, a cluster
+    of roots is replaced by its mean"""
+    roots = np.asarray(roots)
+    if len(roots) == 0:
+        return roots
+    cluster = np.cumsum(np.r_[True, np.diff(roots) > tol]) - 1
+    return np.bincount(cluster, roots) / np.bincount(cluster)
+
+
+def root_tolerance(knots, tol):
+    """Distance below which the roots of a spline on knots are merged
+
+    A simple root is found by a few neighbouring parts of size tol. A
+    multiple root, e.g. where the spline touches zero, can only be resolved
+    to about sqrt(eps) times the domain, as the spline is below the
+    round-off level in a neighbourhood of that size.
+    """
+    eps = np.finfo(float).eps
+    return max(4*tol, 10*np.sqrt(eps)) * (knots[-1] - knots[0])
+
+
 class Basis(object):
     """A generic spline basis with a knot sequence and degree
     """
@@ -202,29 +379,185 @@ class BSplineBasis(Basis):
     def eval_basis(self, x):
         """Evaluate the BSplineBasis at x.
 
-        This function implements the Cox-de Boor formula for B-splines
+        For every point, the knot span is looked up with a binary search and
+        only the degree+1 basis functions that are nonzero on that span are
+        computed with the de Boor recursion [de Boor, Chapter X, 2001]. The
+        result is assembled directly as a sparse matrix with one row per
+        point.
+        """
+        return self._eval(x)
+
+    @memoize
+    def eval_basis_ext(self, x):
+        """Evaluate the BSplineBasis at x, using the conventions of
+        scipy.interpolate.splev: knot spans are closed on the left and
+        outside the domain, the polynomial pieces of the first and last knot
+        span are extrapolated."""
+        return self._eval(x, side='right', extrapolate=True)
+
+    def _eval(self, x, side='left', extrapolate=False):
+        x = np.atleast_1d(np.array(x, dtype=float)).ravel()
+        span, valid = self.find_span(x, side)
+        cols, vals = self._eval_span(x, span)
+        mask = (cols >= 0) & (cols < len(self)) & (vals != 0.)
+        if not extrapolate:
+            mask &= valid[:, None]
+        indptr = np.r_[0, np.cumsum(mask.sum(axis=1))]
+        return csr_matrix_alt((vals[mask], cols[mask], indptr),
+                              shape=(len(x), len(self)))
+
+    def find_span(self, x, side='left'):
+        """Return the knot span index of every point in x.
+
+        With side='left', a point belongs to span i if
+        knots[i] < x <= knots[i+1]. This is the convention of the indicator
+        functions of the Cox-de Boor formula. With side='right', a point
+        belongs to span i if knots[i] <= x < knots[i+1]. Points on or outside
+        the boundary of the domain get the first or last nonempty span. The
+        second return value flags the points in the domain.
         """
-        x = np.array(x)
         k = self.knots
-        basis = [[self._ind(i, x) * 1.0 for i in range(len(k) - 1)]]
-        for d in range(1, self.degree + 1):
-            basis.append([])
-            for i in range(len(k) - d - 1):
-                b = 0 * x
-                bottom = k[i + d] - k[i]
-                if bottom != 0:
-                    b = (x - k[i]) * basis[d - 1][i] / bottom
-                bottom = k[i + d + 1] - k[i + 1]
-                if bottom != 0:
-                    b += (k[i + d + 1] - x) * basis[d - 1][i + 1] / bottom
-                basis[-1].append(b)
-        # Consider sparse matrices?
-        return csr_matrix_alt(np.c_[basis[-1]].T)
+        first = np.searchsorted(k, k[0], side='right') - 1
+        last = np.searchsorted(k, k[-1], side='left') - 1
+        span = np.clip(np.searchsorted(k, x, side=side) - 1, first, last)
+        valid = (x >= k[0]) & (x <= k[-1])
+        return span, valid
+
+    def _eval_span(self, x, span):
+        """Evaluate the degree+1 basis functions which are nonzero on the
+        knot span of each point.
+
+        Returns the column index and value of these basis functions, both of
+        shape (len(x), degree+1). If x has shape (len(span), degree), its
+        columns are used as arguments for the successive levels of the
+        recursion, which evaluates the blossom of the basis functions.
+        """
+        d = self.degree
+        # pad the knots such that the recursion is well defined near the
+        # boundary of unclamped bases, the padded functions are dropped
+        k = np.r_[self.knots[0]*np.ones(d), self.knots,
+                  self.knots[-1]*np.ones(d)]
+        i = span + d
+        vals = np.zeros((len(span), d + 1))
+        vals[:, 0] = 1.
+        for j in range(1, d + 1):
+            xj = x[:, j - 1] if x.ndim == 2 else x
+            saved = np.zeros(len(span))
+            for r in range(j):
+                right = k[i + r + 1] - xj
+                left = xj - k[i + 1 - j + r]
+                temp = vals[:, r] / (right + left)
+                vals[:, r] = saved + right * temp
+                saved = left * temp
+            vals[:, j] = saved
+        cols = span[:, None] - d + np.arange(d + 1)
+        return cols, vals
+
+    def contains(self, other):
+        """Return True if every spline in other is also a spline in this
+        basis, i.e. if other is obtained by knot insertion and/or degree
+        elevation of this basis."""
+        r = self.degree - other.degree
+        if (r < 0 or self.knots[0] != other.knots[0] or
+                self.knots[-1] != other.knots[-1]):
+            return False
+        c_self = Counter(self.knots)
+        return all(c_self.get(b, 0) >= m + r
+                   for b, m in Counter(other.knots).items())
+
+    def _collocation_points(self):
+        """Return collocation points satisfying the Schoenberg-Whitney
+        conditions, or None if no such points are found."""
+        if self.degree == 0:
+            x = 0.5*(self.knots[:-1] + self.knots[1:])
+            x = x[self.knots[:-1] < self.knots[1:]]
+        else:
+            # averaging the knots may push the end points out of the domain
+            x = np.clip(self.greville(), self.knots[0], self.knots[-1])
+        if len(x) != len(self) or np.any(np.diff(x) <= 0.):
+            return None
+        return x
+
+    def _collocate(self, fun, lower, upper):
+        """Express functions, which lie in the span of this basis, in this
+        basis by collocation.
+
+        fun evaluates the functions (columns) in a set of points. As the
+        representation of a spline is local, a function with support
+        [lower, upper] only depends on basis functions with support inside
+        this interval: the other coefficients are exactly zero.
+        """
+        x = self._collocation_points()
+        if x is None:
+            return None
+        try:
+            lu = splu(self(x).tocsc())
+        except RuntimeError:  # singular collocation matrix
+            return None
+        T = lu.solve(np.asarray(fun(x).toarray(), dtype=float))
+        inside = ((self.knots[:len(self), None] >= lower[None, :]) &
+                  (self.knots[self.degree + 1:, None] <= upper[None, :]))
+        T = T*inside
+        # round-off would become structural nonzeros in symbolic products
+        T[abs(T) < 1e-10] = 0.
+        return csr_matrix_alt(T)
+
+    def _knot_insertion(self, other):
+        """Transformation from other to this basis, in case this basis is
+        obtained by inserting knots in other (Oslo algorithm).
+
+        Row i of the transformation matrix consists of the blossoms of the
+        basis functions of other, evaluated in knots[i+1:i+degree+1].
+        """
+        t, tau, d = self.knots, other.knots, self.degree
+        n = len(self)
+        last = np.searchsorted(tau, tau[-1], side='left') - 1
+        span = np.minimum(np.searchsorted(tau, t[:n], side='right') - 1, last)
+        x = np.array([t[j:j + n] for j in range(1, d + 1)]).T.reshape(n, d)
+        cols, vals = other._eval_span(x, span)
+        mask = (cols >= 0) & (cols < len(other)) & (vals != 0.)
+        indptr = np.r_[0, np.cumsum(mask.sum(axis=1))]
+        return csr_matrix_alt((vals[mask], cols[mask], indptr),
+                              shape=(n, len(other)))
+
+    @memoize
+    def _nested_transform(self, other):
+        if self.degree == other.degree:
+            return self._knot_insertion(other)
+        # degree elevation
+        return self._collocate(other, other.knots[:len(other)],
+                               other.knots[other.degree + 1:])
+
+    @memoize
+    def product(self, other):
+        """Return the basis of the product of splines in self and other,
+        together with the pairs of basis functions with overlapping support
+        and the sparse transformation matrix T such that
+
+            self(x)[:, pairs[0]] * other(x)[:, pairs[1]] = basis(x).T
+        """
+        basis = self * other
+        pairs, _ = self.pairs(other)
+        T = None
+        if basis.contains(self) and basis.contains(other):
+            def fun(x):
+                return self(x)[:, pairs[0]].multiply(other(x)[:, pairs[1]])
+            lower = np.maximum(self.knots[pairs[0]], other.knots[pairs[1]])
+            upper = np.minimum(self.knots[pairs[0] + self.degree + 1],
+                               other.knots[pairs[1] + other.degree + 1])
+            T = basis._collocate(fun, lower, upper)
+        if T is None:  # fall back on sampling
+            b_self = self(basis._x)
+            b_other = other(basis._x)
+            basis_product = b_self[:, pairs[0]].multiply(b_other[:, pairs[1]])
+            T = basis.transform(lambda y: basis_product.toarray()[y, :])
+        return basis, pairs, T
 
     def derivative(self, o=1):
         """Returns derivative of the basisfunctions
 
         Computes the derivative using eq. (16) in [de Boor, Chapter X, 2001].
+        The result is cached, so the operator is built only once per basis.
 
         Args:
             x (numpy.array): grid on which to evaluate basisfunctions
@@ -234,17 +567,38 @@ class BSplineBasis(Basis):
             Numpy.array: columns contain the value of the derivative of the
                 basisfunction evaluated at x
         """
+        return self._derivative(o)
+
+    @memoize
+    def _derivative(self, o):
         B = self.__class__(self.knots[o:-o], self.degree - o)
-        P = np.eye(len(self))
+        P = identity(len(self), format='csr')
         knots = self.knots
         for i in range(o):
             knots = knots[1:-1]
             delta_knots = knots[self.degree - i:] - knots[:- self.degree + i]
-            T = np.zeros((len(self) - 1 - i, len(self) - i))
-            j = np.arange(len(self) - 1 - i)
-            T[(j, j)] = -1. / delta_knots
-            T[(j, j + 1)] = 1. / delta_knots
-            P = (self.degree - i) * np.dot(T, P)
+            n = len(self) - 1 - i
+            T = diags([-1. / delta_knots, 1. / delta_knots], [0, 1],
+                      shape=(n, n + 1), format='csr')
+            P = (self.degree - i) * T.dot(P)
+        return B, csr_matrix_alt(P)
+
+    @memoize
+    def running_integral(self):
+        """Returns the basis of the running integral of the basisfunctions
+
+        Computes the integral using eq. (X.33) in [de Boor, 2001].
+
+        Returns:
+            (BSplineBasis, csr_matrix_alt): basis of degree + 1 and sparse
+                matrix P such that P.dot(coeffs) are the coefficients of the
+                running integral, which is 0 at knots[0]
+        """
+        knots = self.knots
+        d = self.degree
+        B = self.__class__(np.r_[knots[0], knots, knots[-1]], d + 1)
+        w = (knots[d + 1:] - knots[:-(d + 1)]) / float(d + 1)
+        P = np.tril(np.ones((len(B), len(self))), -1) * w
         return B, csr_matrix_alt(P)
 
     def support(self):
@@ -275,8 +629,16 @@ class BSplineBasis(Basis):
 
             self(x).T = other(x)
 
+        If other is contained in this basis, T is exact and cached. Otherwise
+        T is computed by interpolation in the maxima of the basis functions,
+        determined on a grid of NO_POINTS points.
+
         TODO: Can we use the greville points instead of max?
         """
+        if isinstance(other, BSplineBasis) and self.contains(other):
+            T = self._nested_transform(other)
+            if T is not None:
+                return T
         b = self(self._x).toarray()
         m = np.argmax(b, axis=0)
         # x = np.linspace(self.knots[0], self.knots[-1], NO_POINTS)
@@ -293,23 +655,55 @@ class BSplineBasis(Basis):
         T[abs(T) < TOL] = 0.
         return csr_matrix_alt(T)
 
-    def as_poly(self):
-        """Returns polynomial description of the basis functions"""
+    @memoize
+    def piecewise_poly(self):
+        """Returns the piecewise polynomial description of the basis
+
+        On every nonempty knot span [lo[j], hi[j]], a spline in this basis is
+        a polynomial in u = (x - lo[j])/(hi[j] - lo[j]). The coefficient of
+        u**m on span j is obtained as row m*len(lo) + j of P.dot(coeffs).
+
+        Returns:
+            (numpy.array, numpy.array, csr_matrix_alt): lo, hi and P
+        """
         k = self.knots
-        k_min, k_max = min(self.knots), max(self.knots)
-        basis = [[ppoly([a, b], [[1]]) for (a, b) in zip(k[:-1], k[1:])]]
-        for d in range(1, self.degree + 1):
-            basis.append([])
-            for i in range(len(k) - d - 1):
-                b = ppoly([k_min, k_max], [0])
-                bottom = k[i + d] - k[i]
-                if bottom != 0:
-                    b += ppoly([k_min, k_max], [[-k[i], 1]]) * basis[d - 1][i] * (1. / bottom)
-                bottom = k[i + d + 1] - k[i + 1]
-                if bottom != 0:
-                    b += ppoly([k_min, k_max], [[k[i + d + 1], -1]]) * basis[d - 1][i + 1] * (1. / bottom)
-                basis[-1].append(b)
-        return basis[-1]
+        d = self.degree
+        span = np.where(k[:-1] < k[1:])[0]
+        lo, hi = k[span], k[span + 1]
+        S = len(span)
+        # interpolate the basis functions in d+1 points of every span
+        u = np.linspace(0., 1., d + 1)
+        x = (lo[:, None] + (hi - lo)[:, None]*u).ravel()
+        cols, vals = self._eval_span(x, np.repeat(span, d + 1))
+        V = np.vander(u, d + 1, increasing=True)
+        P = np.einsum('mi,sif->smf', la.inv(V), vals.reshape(S, d + 1, d + 1))
+        rows = np.arange(d + 1)[None, :, None]*S + np.arange(S)[:, None, None]
+        rows = np.broadcast_to(rows, P.shape)
+        cols = np.broadcast_to(cols.reshape(S, d + 1, d + 1)[:, :1, :], P.shape)
+        mask = (cols >= 0) & (cols < len(self)) & (P != 0.)
+        P = csr_matrix_alt((P[mask], (rows[mask], cols[mask])),
+                           shape=(S*(d + 1), len(self)))
+        return lo, hi, P
+
+    @memoize
+    def bezier_extraction(self):
+        """Returns the Bezier description of the basis
+
+        Same as piecewise_poly, but row k*len(lo) + j of Z.dot(coeffs) is the
+        k-th Bernstein coefficient of the polynomial piece on span j.
+
+        Returns:
+            (numpy.array, numpy.array, csr_matrix_alt): lo, hi and Z
+        """
+        lo, hi, P = self.piecewise_poly()
+        d = self.degree
+        # conversion of monomial to Bernstein coefficients on [0, 1]
+        M = np.zeros((d + 1, d + 1))
+        for k in range(d + 1):
+            for m in range(k + 1):
+                M[k, m] = comb(k, m) / comb(d, m)
+        Z = kron(M, identity(len(lo))).dot(P)
+        return lo, hi, csr_matrix_alt(Z)
 
 
 class NurbsBasis(Basis):
@@ -399,12 +793,7 @@ class BSpline(Spline):
 
     def __mul__(self, other):
         if isinstance(other, self.__class__):
-            basis = self.basis * other.basis
-            pairs, S = self.basis.pairs(other.basis)
-            b_self = self.basis(basis._x)
-            b_other = other.basis(basis._x)
-            basis_product = b_self[:, pairs[0]].multiply(b_other[:, pairs[1]])
-            T = basis.transform(lambda y: basis_product.toarray()[y, :])
+            basis, pairs, T = self.basis.product(other.basis)
             try:
                 coeffs_product = (self.coeffs[pairs[0].tolist()] *
                                   other.coeffs[pairs[1].tolist()])
@@ -469,22 +858,21 @@ class BSpline(Spline):
         # try:
         #     return sum(coeffs * (knots[d + 1:] - knots[:-(d + 1)])) / (d + 1)
 
-    def roots(self):
+    def roots(self, tol=1e-12):
         """Return the roots of the B-spline
 
         Algorithm:
-        * Determine polynomial description
-        * Determine roots of each polynomial subpiece
-        * Check if root is in the support of the polynomial piece
+        * Determine the Bezier pieces of the spline
+        * Subdivide the pieces, dropping the parts for which the convex hull
+          of the Bernstein coefficients does not contain zero
+
+        Roots of pieces which are identically zero are not returned.
         """
-        basis = self.basis.as_poly()
-        spline = np.sum([self.coeffs[i] * basis[i] for i in range(len(basis))])
-        roots = []
-        for i, f in enumerate(spline.functions):
-            root = f.roots()
-            roots.extend([r for r in root
-                         if spline.knots[i] <= r < spline.knots[i + 1]])
-        return roots
+        lo, hi, Z = self.basis.bezier_extraction()
+        ctrl = Z.dot(np.array(self.coeffs, dtype=float).ravel())
+        ctrl = ctrl.reshape(self.basis.degree + 1, len(lo)).T
+        _, roots = bernstein_roots(ctrl, lo, hi, tol, np.abs(ctrl).max())
+        return unique_roots(roots, root_tolerance(self.basis.knots, tol))
 
     def scale(self, factor, shift=0):
         # by default the domain is [0,1]
@@ -493,6 +881,52 @@ class BSpline(Spline):
         return self.__class__(basis, self.coeffs)
 
 
+class SplineSet(object):
+    """A set of splines sharing one B-spline basis, e.g. the coordinates of a
+    trajectory.
+
+    The coefficients are stored in one (len(basis) x n) array, with a column
+    per spline. Indexing and iteration give the separate BSplines, so a
+    SplineSet can be used as a list of BSplines.
+    """
+    def __init__(self, basis, coeffs):
+        self.basis = basis
+        self.coeffs = np.array(coeffs, dtype=float).reshape(len(basis), -1)
+
+    def __len__(self):
+        return self.coeffs.shape[1]
+
+    def __getitem__(self, k):
+        if isinstance(k, slice):
+            return self.__class__(self.basis, self.coeffs[:, k])
+        return BSpline(self.basis, self.coeffs[:, k])
+
+    def __iter__(self):
+        for k in range(len(self)):
+            yield self[k]
+
+    def __call__(self, x):
+        """Evaluate all splines in x, with a column per spline"""
+        return self.basis(x).dot(self.coeffs)
+
+    def derivative(self, o=1):
+        if o == 0:
+            return self
+        else:
+            Bd, Pd = self.basis.derivative(o=o)
+            return self.__class__(Bd, Pd.dot(self.coeffs))
+
+    def integral(self):
+        """Returns the integrals over the support, see BSpline.integral"""
+        knots = self.basis.knots
+        d = self.basis.degree
+        return ((knots[d + 1:] - knots[:-(d + 1)]) / (d + 1.)).dot(self.coeffs)
+
+    def scale(self, factor, shift=0):
+        basis = self.basis.scale(factor, shift=shift)
+        return self.__class__(basis, self.coeffs)
+
+
 class Nurbs(Spline):
     def __init__(self, basis, coeffs):
         super(Nurbs, self).__init__(basis, coeffs)
@@ -568,34 +1002,44 @@ class TensorBSpline(object):
         return len(self.basis)
 
     def __call__(self, x):
-        """Evaluate TensorBSpline
-        There still seems to be something wrong here...
+        """Evaluate TensorBSpline on the grid spanned by x[0], x[1], ...
+
+        The sparse basis evaluations are contracted with the coefficients one
+        dimension at a time.
         """
-        s = np.inner(self.basis[-1](x[-1]).toarray(), self.coeffs)
-        for i in reversed(range(self.dims() - 1)):
-            s = np.inner(self.basis[i](x[i]).toarray(), s)
+        s = self.coeffs
+        for i, b in enumerate(self.basis):
+            s = _dot_axis(b(x[i]), s, i)
         return s
 
+    def eval_points(self, x):
+        """Evaluate TensorBSpline in the points (x[0][j], x[1][j], ...)
+
+        Only the (degree + 1)**dims coefficients which are active in a point
+        are gathered and contracted with the local basis values.
+        """
+        x = [np.atleast_1d(np.array(xi, dtype=float)).ravel() for xi in x]
+        n_dims = self.dims()
+        index, values = [], np.ones((len(x[0]),) + (1,) * n_dims)
+        for i, b in enumerate(self.basis):
+            span, valid = b.find_span(x[i])
+            cols, vals = b._eval_span(x[i], span)
+            vals[(cols < 0) | (cols >= len(b)) | ~valid[:, None]] = 0.
+            shape = [len(x[i])] + [1] * n_dims
+            shape[i + 1] = b.degree + 1
+            index.append(np.clip(cols, 0, len(b) - 1).reshape(shape))
+            values = values * vals.reshape(shape)
+        active = self.coeffs[tuple(index)]
+        return (values * active).reshape(len(x[0]), -1).sum(axis=1)
+
     def __add__(self, other):
         if isinstance(other, TensorBSpline) and other.var == self.var:
-            if self.dims() == 2 and get_module(self.coeffs) in ['cvxpy', 'cvxopt']:
-                basis = map(lambda x, y: x + y, self.basis, other.basis)
-                Tself = map(lambda x, y: cvxopt.matrix(x.transform(y).toarray()), basis, self.basis)
-                Tother = map(lambda x, y: cvxopt.matrix(x.transform(y).toarray()), basis, other.basis)
-                cself = Tself[0] * self.coeffs * Tself[1].T
-                cother = Tother[0] * other.coeffs * Tother[1].T
-                coeffs = cself + cother
-            else:
-                basis = map(lambda x, y: x + y, self.basis, other.basis)
-                Tself = map(lambda x, y: x.transform(y).toarray(), basis, self.basis)
-                Tother = map(lambda x, y: x.transform(y).toarray(), basis, other.basis)
-                cself = self.coeffs
-                for i in range(self.dims()):
-                    cself = np.tensordot(Tself[i], cself.swapaxes(0, i), axes=[1, 0]).swapaxes(0, i)
-                cother = other.coeffs
-                for i in range(other.dims()):
-                    cother = np.tensordot(Tother[i], cother.swapaxes(0, i), axes=[1, 0]).swapaxes(0, i)
-                coeffs = cself + cother
+            basis = map(lambda x, y: x + y, self.basis, other.basis)
+            cself, cother = self.coeffs, other.coeffs
+            for i in range(self.dims()):
+                cself = _dot_axis(basis[i].transform(self.basis[i]), cself, i)
+                cother = _dot_axis(basis[i].transform(other.basis[i]), cother, i)
+            coeffs = cself + cother
         else:
             try:
                 basis = self.basis
@@ -616,21 +1060,14 @@ class TensorBSpline(object):
 
     def __mul__(self, other):
         if isinstance(other, TensorBSpline):
-            if len(self.basis) > 2:
-                return NotImplementedError("Too complex to implement :-)")
-            basis = map(lambda x, y: x * y, self.basis, other.basis)
-            pairs = map(lambda x, y: x.pairs(y)[0], self.basis, other.basis)
-            basis_product = map(lambda x, y, p, b: x(b._x)[:, p[0]].multiply(y(b._x)[:, p[1]]), self.basis, other.basis, pairs, basis)
-            coeffs_product = (self.coeffs[pairs[0][0]].T[pairs[1][0]] *
-                              other.coeffs[pairs[0][1]].T[pairs[1][1]])
-            T = map(lambda x, b: b.transform(lambda y: x.toarray()[y, :]), basis_product, basis)
-            coeffs = coeffs_product.T
-            for i, t in enumerate(T):
-                coeffs = np.tensordot(t.toarray(), coeffs.swapaxes(0, i), axes=[1, 0]).swapaxes(0, i)
-            return self.__class__(basis, coeffs, self.var)
-            return self.coeffs[pairs[0][0].tolist(), pairs[1][0].tolist()] * other.coeffs[pairs[0][1].tolist(), pairs[1][1].tolist()]
-            # coeffs_product = np.kron(self.coeffs, other.coeffs)
-
+            products = map(lambda x, y: x.product(y), self.basis, other.basis)
+            basis = [p[0] for p in products]
+            pairs = [p[1] for p in products]
+            # products of the coefficients of all pairs of basis functions
+            coeffs = (self.coeffs[np.ix_(*[p[0] for p in pairs])] *
+                      other.coeffs[np.ix_(*[p[1] for p in pairs])])
+            for i, p in enumerate(products):
+                coeffs = _dot_axis(p[2], coeffs, i)
         else:
             try:
                 basis = self.basis
@@ -652,10 +1089,15 @@ class TensorBSpline(object):
         deg = [b.degree for b in self.basis]
         K = [(k[d + 1:] - k[:-(d + 1)]) / (d + 1)
              for (k, d) in zip(knots, deg)]
-        if self.dims() == 2: #get_module(self.coeffs) in ['cvxpy', 'cvxopt']:
-            i = cvxopt.matrix(K[0]).T * self.coeffs * cvxopt.matrix(K[1])
-            return i
         i = np.inner(K[-1], coeffs)
-        for ki in K[:-1]:
+        for ki in reversed(K[:-1]):
             i = np.inner(ki, i)
         return i
+
+
+def _dot_axis(T, coeffs, axis):
+    """Multiply the (sparse) matrix T with coeffs along the given axis"""
+    c = np.moveaxis(coeffs, axis, 0)
+    shape = c.shape
+    c = np.asarray(T.dot(c.reshape(shape[0], -1)))
+    return np.moveaxis(c.reshape((T.shape[0],) + shape[1:]), 0, axis)
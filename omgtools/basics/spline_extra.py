@@ -17,62 +17,48 @@
 # License along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
 
-from spline import BSpline, BSplineBasis
-from casadi import SX, MX, mtimes, Function, vertcat
-from scipy.interpolate import splev
+from spline import (BSpline, BSplineBasis, SplineSet, bernstein_roots,
+                    unique_roots, root_tolerance)
+from spline import _register_cache, MEMOIZE_SIZE
+from casadi import SX, MX, DM, mtimes, Function, vertcat
 import scipy.linalg as la
 import numpy as np
+from collections import OrderedDict
 
 import warnings
 
 def evalspline(s, x):
     # Evaluate spline with symbolic variable
-    # This is possible not the best way to implement this. The conditional node
-    # from casadi should be considered
-    Bl = s.basis
+    # For a numeric x, only the basis functions which are nonzero in x are
+    # required. For a symbolic x, the spline is written as a piecewise
+    # polynomial: all pieces are evaluated at once with Horner's scheme and
+    # the knot span containing x is selected. This gives the same values as
+    # the Cox-de Boor recursion, with a much smaller expression graph.
     coeffs = s.coeffs
-    k = Bl.knots
-    basis = [[]]
-    for i in range(len(k) - 1):
-        if i < Bl.degree + 1 and Bl.knots[0] == Bl.knots[i]:
-            basis[-1].append((x >= Bl.knots[i])*(x <= Bl.knots[i + 1]))
-        else:
-            basis[-1].append((x > Bl.knots[i])*(x <= Bl.knots[i + 1]))
-    for d in range(1, Bl.degree + 1):
-        basis.append([])
-        for i in range(len(k) - d - 1):
-            b = 0 * x
-            bottom = k[i + d] - k[i]
-            if bottom != 0:
-                b = (x - k[i]) * basis[d - 1][i] / bottom
-            bottom = k[i + d + 1] - k[i + 1]
-            if bottom != 0:
-                b += (k[i + d + 1] - x) * basis[d - 1][i + 1] / bottom
-            basis[-1].append(b)
-    result = 0.
-    for l in range(len(Bl)):
-        result += mtimes(coeffs[l], basis[-1][l])
-    return result
+    if not isinstance(coeffs, (SX, MX)):
+        coeffs = np.array(coeffs, dtype=float)
+    if not isinstance(x, (SX, MX)):
+        result = s.basis(np.array(x, dtype=float)).dot(coeffs)
+        return result if isinstance(coeffs, (SX, MX)) else DM(result)
+    lo, hi, P = s.basis.piecewise_poly()
+    S = len(lo)
+    a = P.dot(coeffs)
+    if not isinstance(a, (SX, MX)):
+        a = DM(a)
+    # indicator of the knot span containing x, only the first span is
+    # closed on the left (as in the Cox-de Boor recursion)
+    ind = vertcat(x >= lo[0], x > DM(lo[1:]))*(x <= DM(hi))
+    u = (x - DM(lo))/DM(hi - lo)
+    val = a[s.basis.degree*S:]
+    for m in range(s.basis.degree - 1, -1, -1):
+        val = val*u + a[m*S:(m + 1)*S]
+    return mtimes(ind.T, val)
 
 
 def running_integral(spline):
     # Compute running integral from spline
-    basis = spline.basis
-    coeffs = spline.coeffs
-    knots = basis.knots
-    degree = basis.degree
-
-    knots_int = np.r_[knots[0], knots, knots[-1]]
-    degree_int = degree + 1
-    basis_int = BSplineBasis(knots_int, degree_int)
-    coeffs_int = [0.]
-    for i in range(len(basis_int)-1):
-        coeffs_int.append(coeffs_int[i]+(knots[degree+i+1]-knots[i])/float(degree_int)*coeffs[i])
-    if isinstance(coeffs, (MX, SX)):
-        coeffs_int = vertcat(*coeffs_int)
-    else:
-        coeffs_int = np.array(coeffs_int)
-    spline_int = BSpline(basis_int, coeffs_int)
+    basis_int, P = spline.basis.running_integral()
+    spline_int = BSpline(basis_int, P.dot(spline.coeffs))
     return spline_int
 
 
@@ -87,16 +73,39 @@ def definite_integral(spline, a, b):
 
 def shift_spline(coeffs, t_shift, basis):
     # Extract spline piece in [t_shift, T] and express it in an equidistant
-    # basis. This is not exact as de knot positions change.
+    # basis. This is not exact as de knot positions change. The
+    # transformation is computed anew for every shift, see shift_spline_T.
+    T_tf = shift_spline_T(basis, t_shift)
+    if isinstance(coeffs, (SX, MX)):
+        return mtimes(DM(T_tf), coeffs)
+    return T_tf.dot(np.array(coeffs))
+
+
+_shift_references = _register_cache('shift_reference', MEMOIZE_SIZE)
+
+
+def shift_spline_T(basis, t_shift):
+    # Transformation of shift_spline. The equidistant basis on [t_shift, T]
+    # is an affine image of the one on [0, 1]: the interpolation points, the
+    # maxima of its basis functions, and the LU factors of its interpolation
+    # matrix are computed once per number of knots and degree. Only the
+    # original basis is evaluated for a new shift. The operator itself is not
+    # cached, as the shift differs at practically every update.
     n_knots = len(basis) - basis.degree + 1
-    knots = basis.knots
-    degree = basis.degree
-    knots2 = np.r_[t_shift*np.ones(degree),
-                   np.linspace(t_shift, knots[-1], n_knots),
-                   knots[-1]*np.ones(degree)]
-    basis2 = BSplineBasis(knots2, degree)
-    T_tf = basis2.transform(basis)
-    return T_tf.dot(coeffs)
+    reference = _shift_references.get((n_knots, basis.degree))
+    if reference is None:
+        knots = np.r_[np.zeros(basis.degree), np.linspace(0., 1., n_knots),
+                      np.ones(basis.degree)]
+        basis2 = BSplineBasis(knots, basis.degree)
+        b = basis2(basis2._x).toarray()
+        m = np.argmax(b, axis=0)
+        reference = (basis2._x[m], la.lu_factor(b[m, :]))
+        _shift_references[(n_knots, basis.degree)] = reference
+    u, lu = reference
+    x = t_shift + (basis.knots[-1] - t_shift)*u
+    T_tf = la.lu_solve(lu, basis(x).toarray())
+    T_tf[abs(T_tf) < 1e-10] = 0.
+    return T_tf
 
 
 def extrapolate(coeffs, t_extra, basis):
@@ -310,104 +319,207 @@ def concat_splines(segments, segment_times, n_insert=None):
     # the required amount of knots to insert. If segments are continuous
     # up to degree, no extra knots are required. If they are not continuous
     # at all, degree+1 knots are inserted in between the splines.
-    spl0 = segments[0]
-    knots = [s.basis.knots*segment_times[0] for s in spl0]  # give dimensions
-    degree = [s.basis.degree for s in spl0]
-    coeffs = [s.coeffs for s in spl0]
-    prev_segment = [s.scale(segment_times[0], shift=0) for s in spl0]  # save the combined segment until now (with dimenions)
+    # If the continuity is known (e.g. from connection constraints), pass
+    # n_insert to skip the continuity check. SplineSet segments then get the
+    # same knots for all dimensions and are concatenated at once.
+    if n_insert is not None and all(isinstance(s, SplineSet) for s in segments):
+        return _concat_segments(segments, segment_times, n_insert)
+    return [_concat_segments([segment[l] for segment in segments],
+                             segment_times, n_insert)
+            for l in range(len(segments[0]))]
+
+
+def _concat_segments(segments, segment_times, n_insert):
+    # Concatenate segments of a BSpline or SplineSet
+    degree = segments[0].basis.degree
+    knots = segments[0].basis.knots*segment_times[0]  # give dimensions
+    coeffs = segments[0].coeffs
+    prev_piece = segments[0].scale(segment_times[0], shift=0)  # last segment until now (with dimensions)
     prev_time = segment_times[0]  # save the motion time of combined segment
     for k in range(1, len(segments)):
-        for l, s in enumerate(segments[k]):
-            if s.basis.degree != degree[l]:
-                # all concatenated splines should be of the same degree
-                raise ValueError(
-                    'Splines at index ' + l + 'should have same degree.')
-            if n_insert is None:
-                # check continuity, n_insert can be different for each l
-                n_insert = degree[l]+1  # starts at max value
-                for d in range(degree[l]+1):
-                    # use ipopt default tolerance as a treshold for check (1e-3)
-                    # give dimensions, to compare using the same time scale
-                    # use scale function to give segments[k][l] dimensions
-                    # prev_segment already has dimensions
-
-                    # Todo: sometimes this check fails, or you get 1e-10 and 1e-11 values that should actually be equal
-                    # this seems due to the finite tolerance of ipopt? and due to the fact that these are floating point numbers
-                    val1 = segments[k][l].scale(segment_times[k], shift = prev_time).derivative(d)(prev_time)
-                    val2 = prev_segment[l].derivative(d)(prev_time)
-                    if ( abs(val1 - val2)*0.5/(val1 + val2) <= 1e-3):
-                        # more continuity = insert less knots
-                        n_insert -= 1
-                    else:
-                        # spline values were not equal, stop comparing and use latest n_insert value
-                        break
-            # else:  # keep n_insert from input
-
-            if n_insert!= degree[l]+1:
-                # concatenation requires re-computing the coefficients and/or adding extra knots
-                # here we make the knot vector and coeffs of the total spline (the final output),
-                # but we also compute the knot vector and coeffs for concatenating just two splines,
-                # to limit the size of the system that we need to solve
-                # i.e.: when concatenating 3 splines, we first concatenate segments 1 and 2,
-                # and afterwards segments 2 and 3, this happens due to the main for loop
-
-                # make total knot vector
-                end_idx = len(knots[l])-(degree[l]+1)+n_insert
-                knots[l] = np.r_[
-                    knots[l][:end_idx], s.basis.knots[degree[l]+1:]*segment_times[k] + knots[l][-1]]  # last term = time shift
-
-                # make knot vector for two segments to concatenate
-                end_idx_concat = len(prev_segment[l].basis.knots)-(degree[l]+1)+n_insert
-                knots1 = prev_segment[l].basis.knots[:end_idx_concat]
-                knots2 = s.basis.knots[degree[l]+1:]*segment_times[k] + knots1[-1]  # last term = time shift
-                knots_concat = np.r_[knots1, knots2]
-
-                # make union basis for two segments to concatenate
-                basis_concat = BSplineBasis(knots_concat, degree[l])
-                grev_bc = basis_concat.greville()
-                # shift first and last greville point inwards, to avoid numerical problems,
-                # in which the spline evaluates to 0 because the evaluation lies just outside the domain
-                grev_bc[0] = grev_bc[0] + (grev_bc[1]-grev_bc[0])*0.01
-                grev_bc[-1] = grev_bc[-1] - (grev_bc[-1]-grev_bc[-2])*0.01
-                # evaluate basis on its greville points
-                eval_bc = basis_concat(grev_bc).toarray()
-
-                # only the last degree coeffs of segment1 and the first degree coeffs
-                # of segment2 will change --> we can reduce the size of the system to solve
-                # Todo: implement this reduction
-
-                # first give the segment dimensions, by scaling it and shifting it appropriatly
-                # this is necessary, since by default the domain is [0,1]
-                # then evaluate the splines that you want to concatenate on greville points
-                # of union basis, will give 0 outside their domain
-                s_1 = prev_segment[l](grev_bc)
-                s_2 = segments[k][l].scale(segment_times[k], shift = prev_time)(grev_bc)
-                # sum to get total evaluation
-                eval_sc = s_1 + s_2
-
-                # solve system to find new coeffs
-                coeffs_concat = la.solve(eval_bc, eval_sc)
-                # save new coefficients
-                coeffs[l] = coeffs_concat
-            else:
-                #there was no continuity, just compute new knot vector and stack coefficients
-                knots[l] = np.r_[
-                           knots[l], s.basis.knots[degree[l]+1:]*segment_times[k] + knots[l][-1]]
-                coeffs[l] = np.r_[coeffs[l], s.coeffs]
+        s = segments[k]
+        if s.basis.degree != degree:
+            # all concatenated splines should be of the same degree
+            raise ValueError('Concatenated splines should have same degree.')
+        piece = s.scale(segment_times[k], shift=prev_time)
+        if n_insert is None:
+            n_ins = _required_knots(prev_piece, piece, prev_time)
+        else:
+            n_ins = n_insert
+        # make total knot vector
+        end_idx = len(knots)-(degree+1)+n_ins
+        knots_new = np.r_[
+            knots[:end_idx], s.basis.knots[degree+1:]*segment_times[k] + knots[-1]]  # last term = time shift
+        if n_ins != degree+1:
+            # concatenation requires re-computing the coefficients
+            coeffs = _join_coeffs(BSplineBasis(knots_new, degree), coeffs,
+                                  s.coeffs, prev_piece, piece, prev_time)
+        else:
+            # there was no continuity, just stack coefficients
+            coeffs = np.r_[coeffs, s.coeffs]
+        knots = knots_new
         # going to next segment, update time shift
-        new_bases = [BSplineBasis(knots[l], degree[l])for l in range(len(segments[0]))]
-        prev_segment = [BSpline(new_bases[l], coeffs[l]) for l in range(len(segments[0]))]
+        prev_piece = piece
         prev_time += segment_times[k]
+    return segments[0].__class__(BSplineBasis(knots, degree), coeffs)
+
+
+def _required_knots(spline1, spline2, t):
+    # Return the number of knots required at t to join spline1 and spline2,
+    # i.e. degree+1 minus the number of derivatives that are continuous
+    degree = spline1.basis.degree
+    n_insert = degree+1  # starts at max value
+    for d in range(degree+1):
+        # use ipopt default tolerance as a treshold for check (1e-3)
+
+        # Todo: sometimes this check fails, or you get 1e-10 and 1e-11 values that should actually be equal
+        # this seems due to the finite tolerance of ipopt? and due to the fact that these are floating point numbers
+        val1 = spline2.derivative(d)(t)
+        val2 = spline1.derivative(d)(t)
+        if (abs(val1 - val2)*0.5/(val1 + val2) <= 1e-3):
+            # more continuity = insert less knots
+            n_insert -= 1
+        else:
+            # spline values were not equal, stop comparing and use latest n_insert value
+            break
+    return n_insert
+
+
+def _join_coeffs(basis, coeffs1, coeffs2, spline1, spline2, t):
+    # Compute the coefficients in basis of the spline that equals spline1
+    # before t and spline2 after t. Only the last degree coeffs of spline1 and
+    # the first degree coeffs of spline2 change: the other basis functions of
+    # basis coincide with the ones of spline1 or spline2 and keep their
+    # coefficient. So only the small block of the (banded) collocation
+    # system around t is solved.
+    degree = basis.degree
+    n = len(basis)
+    lo = max(len(coeffs1)-degree, 0)
+    hi = n - max(len(coeffs2)-degree, 0)
+    coeffs = np.r_[coeffs1[:lo], np.zeros((hi-lo,)+np.shape(coeffs1)[1:]),
+                   coeffs2[len(coeffs2)-(n-hi):]]
+    # collocate in the greville points of the unknown basis functions
+    knots = basis.knots
+    x = knots[np.arange(lo, hi)[:, None] + np.arange(1, degree+1)].mean(axis=1)
+    x = np.clip(x, knots[0], knots[-1])
+    B = basis(x).toarray()
+    values = spline2(x)
+    values[x <= t] = spline1(x)[x <= t]
+    values -= B[:, :lo].dot(coeffs[:lo]) + B[:, hi:].dot(coeffs[hi:])
+    coeffs[lo:hi] = la.solve(B[:, lo:hi], values)
+    return coeffs
+
+
+def _group_by_basis(splines):
+    # Return the indices of the splines, grouped by their basis. Equal bases
+    # are grouped as well, as spline operations build a new basis each time.
+    groups = OrderedDict()
+    for k, s in enumerate(splines):
+        key = (type(s.basis), s.basis.degree,
+               np.array(s.basis.knots, dtype=float).tostring())
+        groups.setdefault(key, []).append(k)
+    return groups.values()
 
-    bases = [BSplineBasis(knots[l], degree[l])
-             for l in range(len(segments[0]))]
-    return [BSpline(bases[l], coeffs[l]) for l in range(len(segments[0]))]
 
 def sample_splines(spline, time):
-    if isinstance(spline, list):
-        return [splev(time, (s.basis.knots, s.coeffs, s.basis.degree)) for s in spline]
-    else:
-        return splev(time, (spline.basis.knots, spline.coeffs, spline.basis.degree))
+    # Sample one or more splines on a time grid. Splines sharing the same
+    # basis are sampled together: their basis is evaluated once and
+    # multiplied with the stacked coefficients. As with splev, the splines
+    # are extrapolated outside their domain.
+    if isinstance(spline, SplineSet):
+        values = spline.basis.eval_basis_ext(np.ravel(time)).dot(spline.coeffs)
+        return [v.reshape(np.shape(time)) for v in values.T]
+    if not isinstance(spline, list):
+        return sample_splines([spline], time)[0]
+    time = np.array(time, dtype=float)
+    samples = [None]*len(spline)
+    for indices in _group_by_basis(spline):
+        basis = spline[indices[0]].basis
+        coeffs = np.column_stack([np.array(spline[k].coeffs, dtype=float).ravel()
+                                  for k in indices])
+        values = basis.eval_basis_ext(time.ravel()).dot(coeffs)
+        for l, k in enumerate(indices):
+            samples[k] = values[:, l].reshape(time.shape)
+    return samples
+
+
+def _bezier_pieces(splines, indices):
+    # Return the Bezier pieces of the splines with given indices, which share
+    # their basis: one row of Bernstein coefficients per piece, ordered by
+    # spline, together with the bounds of the pieces.
+    basis = splines[indices[0]].basis
+    lo, hi, Z = basis.bezier_extraction()
+    coeffs = np.column_stack([np.array(splines[k].coeffs, dtype=float).ravel()
+                              for k in indices])
+    ctrl = Z.dot(coeffs).reshape(basis.degree+1, len(lo), len(indices))
+    ctrl = ctrl.transpose(2, 1, 0).reshape(-1, basis.degree+1)
+    return ctrl, np.tile(lo, len(indices)), np.tile(hi, len(indices))
+
+
+def _spline_scale(ctrl, n_splines):
+    # Largest Bernstein coefficient of the spline each row of ctrl belongs to,
+    # the round-off level of the pieces is relative to it.
+    scale = np.abs(ctrl).reshape(n_splines, -1).max(axis=1)
+    return np.repeat(scale, len(ctrl)//n_splines)
+
+
+def spline_roots(splines, tol=1e-12):
+    # Compute the roots of one or more splines. The Bezier pieces of all
+    # splines sharing a basis are subdivided together, pruning the parts of
+    # which the convex hull does not contain zero (see BSpline.roots).
+    if not isinstance(splines, list):
+        return spline_roots([splines], tol)[0]
+    roots = [None]*len(splines)
+    for indices in _group_by_basis(splines):
+        knots = splines[indices[0]].basis.knots
+        ctrl, lo, hi = _bezier_pieces(splines, indices)
+        pieces, rts = bernstein_roots(ctrl, lo, hi, tol,
+                                      _spline_scale(ctrl, len(indices)))
+        owner = pieces // (len(lo)//len(indices))
+        for l, k in enumerate(indices):
+            roots[k] = unique_roots(rts[owner == l], root_tolerance(knots, tol))
+    return roots
+
+
+def spline_extrema(splines, lower=None, upper=None, tol=1e-12):
+    # Compute the minimum and maximum of one or more splines over
+    # [lower, upper] (default: the domain of the splines). Candidates are the
+    # bounds, the knots and the roots of the derivative of the Bezier pieces.
+    # Returns the arrays t_min, v_min, t_max and v_max.
+    if not isinstance(splines, list):
+        return [v[0] for v in spline_extrema([splines], lower, upper, tol)]
+    t_min, v_min = np.zeros(len(splines)), np.zeros(len(splines))
+    t_max, v_max = np.zeros(len(splines)), np.zeros(len(splines))
+    for indices in _group_by_basis(splines):
+        basis = splines[indices[0]].basis
+        a = basis.knots[0] if lower is None else lower
+        b = basis.knots[-1] if upper is None else upper
+        knots = np.unique(basis.knots)
+        points = [np.r_[a, knots[(knots > a) & (knots < b)], b]]*len(indices)
+        if basis.degree > 0:
+            ctrl, lo, hi = _bezier_pieces(splines, indices)
+            ctrl = np.diff(ctrl, axis=1)
+            pieces, rts = bernstein_roots(ctrl, lo, hi, tol,
+                                          _spline_scale(ctrl, len(indices)))
+            owner = pieces // (len(lo)//len(indices))
+            # stationary points, a multiple one only once
+            points = [np.r_[p, unique_roots(rts[(owner == l) & (rts > a) & (rts < b)],
+                                            root_tolerance(basis.knots, tol))]
+                      for l, p in enumerate(points)]
+        owner = np.concatenate([l*np.ones(len(p), dtype=int)
+                                for l, p in enumerate(points)])
+        points = np.concatenate(points)
+        coeffs = np.column_stack([np.array(splines[k].coeffs, dtype=float).ravel()
+                                  for k in indices])
+        # evaluate each spline in its own candidate points
+        values = basis(points).multiply(coeffs[:, owner].T).sum(axis=1)
+        values = np.asarray(values).ravel()
+        for l, k in enumerate(indices):
+            t, v = points[owner == l], values[owner == l]
+            i_min, i_max = np.argmin(v), np.argmax(v)
+            t_min[k], v_min[k] = t[i_min], v[i_min]
+            t_max[k], v_max[k] = t[i_max], v[i_max]
+    return t_min, v_min, t_max, v_max
 
 
 # def integral_sqbasis(basis):
@@ -1,3 +1,4 @@
 from plotlayer import PlotLayer
 from deployer import Deployer
 from simulator import Simulator
+from batch import solve_batch
@@ -0,0 +1,114 @@
+# This file is part of OMG-tools.
+#
+# OMG-tools -- Optimal Motion Generation-tools
+# Copyright (C) 2016 Ruben Van Parys & Tim Mercy, KU Leuven.
+# All rights reserved.
+#
+# OMG-tools is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+from deployer import Deployer
+import numpy as np
+import multiprocessing
+
+# problem, deployer and base state of a batch worker process
+_batch = {}
+
+
+def _save_state(problem):
+    # attributes of the problem, its vehicles and its obstacles. Solving and
+    # deploying rebind attributes or the items of dictionaries such as
+    # prediction and signals, so copying the dictionaries and lists one level
+    # deep suffices. The results of earlier deployments are left out of the
+    # vehicle states, otherwise a job would continue from them.
+    state = []
+    for obj in [problem] + problem.vehicles + problem.environment.obstacles:
+        attributes = dict(obj.__dict__)
+        if obj in problem.vehicles:
+            for key in ['signals', 'trajectories', 'trajectories_kn']:
+                attributes.pop(key, None)
+        state.append((obj, attributes))
+    return state
+
+
+def _restore_state(state):
+    for obj, attributes in state:
+        obj.__dict__.clear()
+        for key, value in attributes.items():
+            if isinstance(value, dict):
+                value = dict(value)
+            elif isinstance(value, list):
+                value = list(value)
+            obj.__dict__[key] = value
+
+
+def _init_batch(problem, sample_time):
+    _batch['problem'] = problem
+    _batch['deployer'] = Deployer(problem, sample_time)
+    _batch['state'] = _save_state(problem)
+
+
+def _solve_job(job):
+    # every job starts from the base state, so the results do not depend on
+    # the jobs solved before in the same process
+    problem, deployer = _batch['problem'], _batch['deployer']
+    _restore_state(_batch['state'])
+    initial, terminal = job[0], job[1]
+    obstacles = job[2] if len(job) > 2 else []
+    if len(problem.vehicles) == 1:
+        initial, terminal = [initial], [terminal]
+    for vehicle, state0, poseT in zip(problem.vehicles, initial, terminal):
+        vehicle.set_initial_conditions(state0)
+        vehicle.set_terminal_conditions(poseT)
+    for obstacle, state in zip(problem.environment.obstacles, obstacles):
+        if state is not None:
+            obstacle.set_state(state)
+    try:
+        deployer.reset()
+        # a single update plans the whole horizon, the update time is only
+        # the time until a next update: one sample
+        trajectories = deployer.update(0., update_time=deployer.sample_time)
+    except Exception as error:  # a failing job should not end the batch
+        return {'trajectories': None,
+                'status': {'return_status': 'Exception', 'error': str(error)}}
+    return {'trajectories': trajectories, 'status': problem.solve_status}
+
+
+def solve_batch(problem, jobs, processes=None, sample_time=0.01):
+    # Solve a point-to-point problem for a list of jobs (initial state,
+    # terminal state[, obstacle states]). Obstacle states are dictionaries as
+    # for Obstacle.set_state, in the order of the environment, None keeps an
+    # obstacle as it is. With several vehicles, the states are lists with one
+    # state per vehicle. The problem is built once, before forking the worker
+    # processes, which all inherit it. Every job starts from the state of the
+    # problem at the call, which is left unchanged. Returns per job the
+    # trajectories and the solve status.
+    if not hasattr(problem, 'problem'):
+        problem.init()
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    processes = min(processes, len(jobs))
+    if processes <= 1:
+        _init_batch(problem, sample_time)
+        try:
+            return [_solve_job(job) for job in jobs]
+        finally:
+            # leave the problem of the caller as it was
+            _restore_state(_batch['state'])
+    pool = multiprocessing.Pool(processes, _init_batch, (problem, sample_time))
+    try:
+        results = pool.map(_solve_job, jobs)
+    finally:
+        pool.close()
+        pool.join()
+    return results
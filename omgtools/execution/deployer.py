@@ -18,17 +18,42 @@
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
 
 import numpy as np
+import multiprocessing
 from matplotlib import pyplot as plt
 
 
+def _solve_worker(problem, connection):
+    # runs in a forked copy of the deploying process, so the problem and its
+    # solver are inherited instead of rebuilt
+    while True:
+        request = connection.recv()
+        if request is None:
+            break
+        current_time, update_time, parameters, deadline = request
+        problem.father.fix_parameters(parameters)
+        if deadline is None:
+            status = problem.solve(current_time, update_time)
+        else:
+            status = problem.solve(current_time, update_time, deadline)
+        father = problem.father
+        connection.send((np.array(father.get_variables().cat),
+                         np.array(father.get_dual_variables().cat),
+                         np.array(father.get_bound_dual_variables().cat),
+                         status))
+
+
 class Deployer:
 
-    def __init__(self, problem, sample_time=0.01, update_time=0.1):
+    def __init__(self, problem, sample_time=0.01, update_time=0.1, asynchronous=False):
         self.set_problem(problem)
         self.update_time = update_time
         self.sample_time = sample_time
         self.current_time = 0.
         self.iteration0 = True
+        # asynchronous: after the first update, the problem is solved by a
+        # worker process while the vehicles keep executing their trajectories
+        self.asynchronous = asynchronous
+        self.worker = None
         # handy when making multiple instances of deployer
         # in one problem, e.g. gcodeproblem_multi_z.py
         plt.close('all')
@@ -37,10 +62,11 @@ class Deployer:
         self.problem = problem
 
     def reset(self):
+        self.stop()
         self.iteration0 = True
         self.problem.reinitialize()
 
-    def update(self, current_time, states=None, inputs=None, dinputs=None, update_time=None, enforce_states=False, enforce_inputs=False):
+    def update(self, current_time, states=None, inputs=None, dinputs=None, update_time=None, enforce_states=False, enforce_inputs=False, deadline=None):
         current_time = float(current_time)
         if not update_time:
             update_time = self.update_time
@@ -53,6 +79,9 @@ class Deployer:
         elif hasattr(self.problem.vehicles[0], 'trajectories'):
             if round(update_time - float(self.problem.vehicles[0].trajectories['time'][:, -1] - self.current_time),4) >= self.sample_time:
                 update_time = float(self.problem.vehicles[0].trajectories['time'][:, -1] - self.current_time)
+        if self.asynchronous and not self.iteration0:
+            return self.update_async(current_time, states, inputs, dinputs, update_time,
+                                     enforce_states, enforce_inputs, deadline)
         if (self.iteration0):
             self.iteration0 = False
             self.problem.initialize(current_time)
@@ -66,10 +95,17 @@ class Deployer:
                 delay = 0
 
         self.problem.predict(current_time, update_time, self.sample_time, states, inputs, dinputs, delay, enforce_states, enforce_inputs)
-        self.problem.solve(current_time, update_time)
+        if deadline is None:
+            self.problem.solve(current_time, update_time)
+        else:
+            self.problem.solve(current_time, update_time, deadline)
         self.problem.store(current_time, update_time, self.sample_time)
         self.current_time = current_time
-        # return trajectories
+        if self.asynchronous:
+            self.start(current_time)
+        return self.get_trajectories()
+
+    def get_trajectories(self):
         trajectories = {}
         if len(self.problem.vehicles) == 1:
             return self.problem.vehicles[0].trajectories
@@ -78,6 +114,83 @@ class Deployer:
                 trajectories[str(vehicle)] = vehicle.trajectories
         return trajectories
 
+    # ========================================================================
+    # Asynchronous updates
+    # ========================================================================
+
+    def start(self, current_time):
+        # fork the worker, it inherits the solution of the first update
+        self.connection, connection = multiprocessing.Pipe()
+        self.worker = multiprocessing.Process(
+            target=_solve_worker, args=(self.problem, connection))
+        self.worker.daemon = True
+        self.worker.start()
+        self.request = None
+        self.last_start = current_time
+
+    def stop(self):
+        if self.worker is not None:
+            self.connection.send(None)
+            self.worker.join()
+            self.worker = None
+
+    def update_async(self, current_time, states=None, inputs=None, dinputs=None, update_time=None, enforce_states=False, enforce_inputs=False, deadline=None):
+        # The vehicles execute the trajectories of the latest solution (front
+        # buffer) while the worker computes the next one (back buffer), which
+        # is adopted at the first update after it is ready.
+        self.collect()
+        self.shift_trajectories(current_time)
+        self.current_time = current_time
+        n_samp = int(np.round(update_time/self.sample_time, 6))
+        if self.request is not None or any(
+                vehicle.trajectories['time'].size <= n_samp for vehicle in self.problem.vehicles):
+            return self.get_trajectories()
+        # solve for the state predicted at the next update
+        if states is None and all(hasattr(vehicle, 'signals') for vehicle in self.problem.vehicles):
+            states = [vehicle.signals['state'][:, -1] for vehicle in self.problem.vehicles]
+        self.problem.predict(current_time, update_time, self.sample_time, states, inputs, dinputs,
+                             0, enforce_states, enforce_inputs)
+        start = current_time + update_time
+        parameters = self.problem.father.set_parameters(start - self.problem.start_time)
+        self.request = (start, start - self.last_start)
+        self.connection.send(self.request + (np.array(parameters).ravel(), deadline))
+        return self.get_trajectories()
+
+    def collect(self, block=False):
+        # adopt the solution of the worker if it is ready
+        if self.request is None or not (block or self.connection.poll()):
+            return False
+        variables, dual_variables, bound_dual_variables, status = self.connection.recv()
+        father = self.problem.father
+        father.set_variables(variables)
+        father.set_dual_variables(dual_variables)
+        father.set_bound_dual_variables(bound_dual_variables)
+        start, update_time = self.request
+        self.problem.store(start, update_time, self.sample_time)
+        self.problem.solve_status = status
+        self.problem.update_times.append(status['time'])
+        self.request = None
+        self.last_start = start
+        return True
+
+    def shift_trajectories(self, current_time):
+        # let the executing trajectories start at current_time
+        for vehicle in self.problem.vehicles:
+            trajectories = vehicle.trajectories
+            offset = int(np.round((current_time - trajectories['time'].ravel()[0])/self.sample_time, 6))
+            offset = min(offset, trajectories['time'].size-1)
+            if offset > 0:
+                vehicle.trajectories = dict((key, value[..., offset:])
+                                            for key, value in trajectories.items())
+
+    def prepare(self, current_time, update_time=None):
+        # use the idle time before the update at current_time, e.g. to
+        # linearize the problem when solving with real-time iterations
+        if not update_time:
+            update_time = self.update_time
+        if not self.iteration0 and not self.asynchronous:
+            self.problem.prepare(float(current_time), update_time)
+
     def update_segment(self):
         self.reset()
 
@@ -136,14 +249,11 @@ class Deployer:
                 # update values
                 # use original splines here, not the ones from concat_splines, since they are less accurate
                 pos_splines = self.problem.vehicles[0].result_spline_segments[0]
-                input_splines = [s.derivative(1) for s in pos_splines]
-                dinput_splines = [s.derivative(2) for s in pos_splines]
-                ddinput_splines = [s.derivative(3) for s in pos_splines]
                 # compute values at end of first segment = start of the next iteration
-                self.states_end = np.hstack([s(1.) for s in pos_splines])
-                self.inputs_end = np.hstack([s(1.) for s in input_splines])*1./self.problem.motion_times[0]
-                self.dinputs_end = np.hstack([s(1.) for s in dinput_splines])*1./self.problem.motion_times[0]**2
-                self.ddinputs_end = np.hstack([s(1.) for s in ddinput_splines])*1./self.problem.motion_times[0]**3
+                self.states_end = pos_splines(1.).ravel()
+                self.inputs_end = pos_splines.derivative(1)(1.).ravel()*1./self.problem.motion_times[0]
+                self.dinputs_end = pos_splines.derivative(2)(1.).ravel()*1./self.problem.motion_times[0]**2
+                self.ddinputs_end = pos_splines.derivative(3)(1.).ravel()*1./self.problem.motion_times[0]**3
 
                 # save old values
                 # these are the ones that end at the starting state of current iteration
@@ -176,6 +286,7 @@ class Deployer:
 
         # target reached, print final information
         self.problem.final()
+        self.problem.close_pool()
 
     def check_results(self, states, inputs, dinputs, ddinputs, current_time, state_traj_old, input_traj_old, dinput_traj_old, ddinput_traj_old):
         # Try to improve solution for last segment:
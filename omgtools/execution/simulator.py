@@ -49,8 +49,11 @@ class Simulator:
                 self.update_timing(max(0,update_time-self.sample_time))
             else:
                 self.update_timing()
+            if not stop:
+                self.deployer.prepare(self.current_time)
 
         self.problem.final()
+        self.problem.close_pool()
         # return trajectories and signals
         trajectories, signals = {}, {}
         if len(self.problem.vehicles) == 1:
@@ -67,8 +70,10 @@ class Simulator:
             update_time = float(self.problem.vehicles[0].signals['time'][:, -1] - self.current_time)
             self.update_timing(update_time)
             self.problem.final()
+            self.problem.close_pool()
         else:
             self.update_timing(update_time)
+            self.deployer.prepare(self.current_time)
         # return trajectories and signals
         trajectories, signals, curr_state = {}, {}, {}
         # determine remaining motion time
@@ -124,6 +129,7 @@ class Simulator:
         else:
             self.problem.simulate(self.current_time, np.inf, self.sample_time)
         self.problem.final()
+        self.problem.close_pool()
         # determine timing
         update_time = self.problem.vehicles[0].signals['time'][:, -1] - self.current_time
         self.update_timing(update_time)
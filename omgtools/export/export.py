@@ -19,6 +19,7 @@
 
 import os
 import shutil
+import numpy as np
 
 
 def search_casadi():
@@ -472,4 +473,10 @@ class Export(object):
                 code += '\tpar_dict["'+label+'"]["rad"] = obstacles['+str(obst_ind)+'].radii;\n'
                 code += '\n'
                 obst_ind += 1
+            elif 'vehicle' in label:
+                # room geometry parameters (codegen reuse) are constant
+                for name, value in child._values.items():
+                    if name in child._parameters and name.startswith(('room_', 'segment_')):
+                        value = ', '.join([repr(float(v)) for v in np.array(value).ravel(order='F')])
+                        code += '\tpar_dict["'+label+'"]["'+name+'"] = {'+value+'};\n'
         return {'fillParameterDict': code}
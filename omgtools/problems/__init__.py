@@ -7,4 +7,5 @@ from schedulerproblem import SchedulerProblem
 from multiframeproblem import MultiFrameProblem
 from globalplanner import *
 from gcodeproblem import GCodeProblem
-from gcodeschedulerproblem import GCodeSchedulerProblem
\ No newline at end of file
+from gcodeschedulerproblem import GCodeSchedulerProblem
+from library import SolutionLibrary
\ No newline at end of file
@@ -742,7 +742,9 @@ class GCodeSchedulerProblem(Problem):
         local_environment = Environment(room=local_rooms)
         problem = GCodeProblem(self.vehicles[0], local_environment, self.n_segments, motion_time_guess=self.motion_times)
 
-        problem.set_options({'solver_options': self.options['solver_options']})
+        # frames are rebuilt often and mostly share their structure
+        problem.set_options({'solver_options': self.options['solver_options'],
+                             'codegen': {'reuse': True}})
         problem.init()
         # reset the current_time, to ensure that predict uses the provided
         # last input of previous problem and vehicle velocity is kept from one frame to another
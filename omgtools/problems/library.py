@@ -0,0 +1,131 @@
+# This file is part of OMG-tools.
+#
+# OMG-tools -- Optimal Motion Generation-tools
+# Copyright (C) 2016 Ruben Van Parys & Tim Mercy, KU Leuven.
+# All rights reserved.
+#
+# OMG-tools is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 3 of the License, or (at your option) any later version.
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+from scipy.spatial import cKDTree
+import numpy as np
+import cPickle as pickle
+import os
+
+
+class SolutionLibrary:
+    # Converged solutions of a problem, indexed by a feature vector, i.e. the
+    # parameters of the first update: initial and terminal conditions,
+    # obstacle states, ... A new query warm starts from the solution of the
+    # nearest stored feature vector.
+
+    formats = ['npz', 'pickle']
+
+    def __init__(self, path=None, format='npz', max_distance=np.inf,
+                 max_size=None):
+        if format not in self.formats:
+            raise ValueError('Unknown library format ' + format + ', choose ' +
+                             'from ' + ', '.join(self.formats) + '.')
+        self.path = path
+        self.format = format
+        self.max_distance = max_distance
+        self.max_size = max_size
+        self.clear()
+        if path is not None and os.path.isfile(path):
+            self.load(path)
+
+    def __len__(self):
+        return len(self.entries['features'])
+
+    def clear(self):
+        self.entries = {'features': [], 'variables': [], 'duals': [],
+                        'bound_duals': []}
+        self.tree = None
+
+    def add(self, features, variables, duals=None, bound_duals=None):
+        entry = {'features': features, 'variables': variables,
+                 'duals': duals, 'bound_duals': bound_duals}
+        for key, value in entry.items():
+            if value is not None:
+                entry[key] = np.array(value, dtype=float).ravel()
+        if len(self) > 0:
+            for key in ['features', 'variables']:
+                if entry[key].size != self.entries[key][0].size:
+                    raise ValueError('Solution does not match the size of ' +
+                                     'the library ' + key + '.')
+        for key, value in entry.items():
+            self.entries[key].append(value)
+        if self.max_size is not None and len(self) > self.max_size:
+            # forget the oldest solution
+            for key in self.entries:
+                self.entries[key].pop(0)
+        self.tree = None
+
+    def query(self, features):
+        # nearest stored solution within max_distance, or None
+        if len(self) == 0:
+            return None
+        features = np.array(features, dtype=float).ravel()
+        if features.size != self.entries['features'][0].size:
+            raise ValueError('Features do not match the size of the ' +
+                             'library features.')
+        if self.tree is None:
+            self.tree = cKDTree(np.vstack(self.entries['features']))
+        distance, index = self.tree.query(features)
+        if distance > self.max_distance:
+            return None
+        solution = {key: self.entries[key][index] for key in self.entries}
+        solution['distance'] = distance
+        return solution
+
+    # ========================================================================
+    # Persistence
+    # ========================================================================
+
+    def save(self, path=None, format=None):
+        path = path or self.path
+        format = format or self.format
+        if path is None:
+            raise ValueError('Provide a path to save the library.')
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        if format == 'pickle':
+            with open(path, 'wb') as f:
+                pickle.dump(self.entries, f, pickle.HIGHEST_PROTOCOL)
+        else:
+            # missing duals are stored as empty arrays
+            arrays = {}
+            for key, values in self.entries.items():
+                for k, value in enumerate(values):
+                    arrays['%s_%d' % (key, k)] = (np.zeros(0) if value is None
+                                                  else value)
+            # np.savez appends .npz to other extensions
+            with open(path, 'wb') as f:
+                np.savez(f, size=len(self), **arrays)
+
+    def load(self, path=None, format=None):
+        path = path or self.path
+        format = format or self.format
+        self.clear()
+        if format == 'pickle':
+            with open(path, 'rb') as f:
+                self.entries = pickle.load(f)
+        else:
+            with open(path, 'rb') as f:
+                data = np.load(f)
+                for key in self.entries:
+                    for k in range(int(data['size'])):
+                        value = data['%s_%d' % (key, k)]
+                        self.entries[key].append(None if value.size == 0
+                                                 else value)
@@ -171,7 +171,8 @@ class MultiFrameProblem(Problem):
                 round((horizon_time-rel_current_time)/sample_time, 6)) + 1
             time_axis = np.linspace(rel_current_time, rel_current_time + (n_samp-1)*sample_time, n_samp)
             spline_segments = [self.father.get_variables(vehicle, 'splines_seg'+str(k)) for k in range(vehicle.n_seg)]
-            vehicle.store(current_time, sample_time, spline_segments, segment_times, time_axis)
+            # connection constraints impose continuity up to derivative degree-1
+            vehicle.store(current_time, sample_time, spline_segments, segment_times, time_axis, continuity=vehicle.degree)
 
     def reset_init_time(self):
         self.init_time = None
@@ -225,6 +226,10 @@ class MultiFrameProblem(Problem):
             print '%-18s %6g ms' % ('Av update time:',
                                     (sum(self.update_times)*1000. /
                                      len(self.update_times)))
+            if self.options['event_triggered']:
+                print '%-18s %d of %d' % ('Skipped solves:',
+                                          self.trigger_stats['skipped'],
+                                          self.trigger_stats['updates'])
 
     def init_step(self, current_time, update_time):
         if (current_time - self.start_time) > 0:
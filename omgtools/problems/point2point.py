@@ -20,11 +20,19 @@
 from problem import Problem
 from ..basics.spline_extra import definite_integral
 from ..basics.spline_extra import shiftoverknot_T, shift_spline, evalspline
+from ..basics.spline import BSpline
+from globalplanner import AStarPlanner
 from ..export.export_p2p import ExportP2P
 from casadi import inf
 import numpy as np
 
 
+def extent(shape):
+    # radius of the circle around the canvas of a shape
+    limits = shape.get_canvas_limits()
+    return np.linalg.norm([np.max(np.abs(lim)) for lim in limits])
+
+
 class Point2point(object):
     # this class selects between fixed T and free T problem
 
@@ -91,6 +99,107 @@ class Point2pointProblem(Problem):
     def reset_init_time(self):
         self.init_time = None
 
+    # ========================================================================
+    # Multi-start related functions
+    # ========================================================================
+
+    def get_init_guesses(self, variables):
+        # besides the current guess: the path of the A* planner and paths
+        # passing each blocking obstacle on either side, for holonomic
+        # vehicles only
+        from ..vehicles.holonomic import Holonomic
+        for guess in Problem.get_init_guesses(self, variables):
+            yield guess
+        if not all(isinstance(vehicle, Holonomic) and vehicle.n_seg == 1
+                   for vehicle in self.vehicles):
+            return
+        for name, path in self.get_init_paths():
+            for vehicle, waypoints in zip(self.vehicles, path):
+                if waypoints is None:
+                    waypoints = self.path_ends(vehicle)
+                coeffs = self.path_coefficients(vehicle, waypoints)
+                self.father.set_variables(coeffs, vehicle, 'splines_seg0')
+                self.init_hyperplanes(vehicle, coeffs)
+            guess = np.array(self.father.get_variables().cat).ravel()
+            self.father.set_variables(variables)
+            yield name, guess
+
+    def get_init_paths(self):
+        # waypoints per vehicle, None keeps the straight path
+        if 'astar' in self.options['starts']['guesses']:
+            try:
+                yield 'astar', [self.astar_path(vehicle) for vehicle in self.vehicles]
+            except RuntimeError as error:  # no grid or no path
+                if self.options['verbose'] >= 1:
+                    print 'No A* start: %s' % error
+        if 'detour' in self.options['starts']['guesses']:
+            for l, obstacle in enumerate(self.environment.obstacles):
+                for side, sign in [('left', 1.), ('right', -1.)]:
+                    path = [self.detour_path(vehicle, obstacle, sign)
+                            for vehicle in self.vehicles]
+                    if any(waypoints is not None for waypoints in path):
+                        yield '%s_%d' % (side, l), path
+
+    def path_ends(self, vehicle):
+        return (np.array(vehicle.prediction['state'][:2], dtype=float).ravel(),
+                np.array(vehicle.poseT[:2], dtype=float).ravel())
+
+    def astar_path(self, vehicle):
+        start, goal = self.path_ends(vehicle)
+        size = extent(vehicle.shapes[0]) + vehicle.options['safety_distance']
+        planner = AStarPlanner(self.environment, self.options['starts']['astar_cells'],
+                               start.tolist(), goal.tolist(), options={'veh_size': size})
+        waypoints = planner.get_path()
+        # the planner moves start and goal to the grid
+        return [start] + [np.array(w, dtype=float) for w in waypoints[1:-1]] + [goal]
+
+    def detour_path(self, vehicle, obstacle, sign):
+        # pass an obstacle that blocks the straight path on the left (sign 1)
+        # or on the right (sign -1)
+        if obstacle.n_dim != 2 or not obstacle.options['avoid']:
+            return None
+        start, goal = self.path_ends(vehicle)
+        length = np.linalg.norm(goal - start)
+        if length == 0.:
+            return None
+        direction = (goal - start)/length
+        normal = np.array([-direction[1], direction[0]])
+        center = np.array(obstacle.signals['position'][:, -1], dtype=float)
+        clearance = (extent(obstacle.shape) + extent(vehicle.shapes[0]) +
+                     vehicle.options['safety_distance'])
+        along = (center - start).dot(direction)
+        if abs((center - start).dot(normal)) > clearance or not 0. < along < length:
+            return None
+        return [start, center + 1.2*sign*clearance*normal, goal]
+
+    def path_coefficients(self, vehicle, waypoints):
+        # traverse the waypoints at constant speed, the coefficients are the
+        # positions at the greville points
+        waypoints = np.array(waypoints, dtype=float)
+        distance = np.r_[0., np.cumsum(np.linalg.norm(np.diff(waypoints, axis=0), axis=1))]
+        tau = np.array(vehicle.basis.greville())*distance[-1]
+        return np.c_[[np.interp(tau, distance, waypoints[:, k]) for k in range(2)]].T
+
+    def init_hyperplanes(self, vehicle, coeffs):
+        # separating hyperplanes between the guess and the current obstacle
+        # positions, halfway and perpendicular to their connection
+        room = self.environment.room[0]
+        obstacles = room['obstacles'] if 'obstacles' in room else self.environment.obstacles
+        tau = vehicle.knots[vehicle.degree:-vehicle.degree]
+        position = np.c_[[BSpline(vehicle.basis, coeffs[:, k])(tau)
+                          for k in range(2)]].T
+        for k in range(len(vehicle.shapes)):
+            for l, obstacle in enumerate(obstacles):
+                name = 'a_%s_seg0_%d%d' % (vehicle.label, k, l)
+                if not obstacle.options['avoid'] or obstacle.n_dim != 2:
+                    continue
+                center = np.array(obstacle.signals['position'][:, -1], dtype=float)
+                a = center - position
+                a /= np.maximum(np.linalg.norm(a, axis=1), 1e-6)[:, None]
+                b = np.sum(a*0.5*(center + position), axis=1)
+                self.father.set_variables(a, self.environment, name)
+                self.father.set_variables(b, self.environment, 'b'+name[1:])
+
     # ========================================================================
     # Simulation related functions
     # ========================================================================
@@ -112,6 +221,13 @@ class Point2pointProblem(Problem):
             print '%-18s %6g ms' % ('Av update time:',
                                     (sum(self.update_times)*1000. /
                                      len(self.update_times)))
+            if self.options['event_triggered']:
+                print '%-18s %d of %d' % ('Skipped solves:',
+                                          self.trigger_stats['skipped'],
+                                          self.trigger_stats['updates'])
+                if isinstance(self, FreeTPoint2point):
+                    # see the event_triggered option of Problem
+                    print '%-18s %s' % ('', '(never for freeT problems)')
 
     def compute_objective(self):
         raise NotImplementedError('Please implement this method!')
@@ -193,18 +309,18 @@ class FixedTPoint2point(Point2pointProblem):
         if (interval_prev < interval_now): # passed a knot
             self.father.transform_primal_splines(lambda coeffs, basis, T:
                                                  T.dot(coeffs))
-            # self.father.transform_dual_splines(lambda coeffs, basis, T:
-            #                                    T.dot(coeffs))
+            if self.warm_start_duals():
+                self.father.transform_dual_splines(lambda coeffs, basis, T:
+                                                   T.dot(coeffs))
         self.current_time_prev = current_time
 
     def init_primal_transform(self, basis):
         return shiftoverknot_T(basis)
 
-    # def init_dual_transform(self, basis):
-    #     B = integral_sqbasis(basis)
-    #     Binv = np.linalg.solve(B, np.eye(len(basis)))
-    #     T = shiftoverknot_T(basis)
-    #     return B.dot(T).dot(Binv)
+    def init_dual_transform(self, basis):
+        # the multipliers of spline constraints move along with the
+        # constrained coefficients
+        return shiftoverknot_T(basis)
 
     def initialize(self, current_time):
         Point2pointProblem.initialize(self, current_time)
@@ -365,6 +481,8 @@ class FreeTPoint2point(Point2pointProblem):
             # a new basis with new equidistant knots.
             self.father.transform_primal_splines(
                 lambda coeffs, basis: shift_spline(coeffs, update_time/target_time, basis))
+            # the multipliers are kept: in normalized time the constraints
+            # hardly move, while reapproximating them performs worse
             self.father.set_variables(target_time, self, 'T')
 
     def compute_partial_objective(self, current_time):
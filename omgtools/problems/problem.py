@@ -20,10 +20,42 @@
 from ..basics.optilayer import OptiFather, OptiChild
 from ..vehicles.fleet import get_fleet_vehicles
 from ..execution.plotlayer import PlotLayer
-from itertools import groupby
+from casadi import DM, inf, mtimes
+from itertools import groupby, islice
 import numpy as np
+import multiprocessing
+import os
 import time
 
+# solver in the multi-start worker processes
+_multistart = {}
+
+
+def _init_multistart(solver):
+    _multistart['solver'] = solver
+
+
+def _solve_start(start):
+    # solve from one initial guess, a homotopy start first solves the
+    # problems with the parameter vectors of its stages
+    name, x0, duals, stages, shared = start
+    solver, args = _multistart['solver'], dict(shared)
+    args['x0'] = x0
+    if duals is not None:
+        args['lam_g0'], args['lam_x0'] = duals
+    try:
+        for par in stages:
+            result = solver(**dict(args, p=par))
+            args.update({'x0': result['x'], 'lam_g0': result['lam_g'],
+                         'lam_x0': result['lam_x']})
+        result = solver(**args)
+    except Exception as error:  # a failing start should not end the race
+        return {'name': name, 'return_status': 'Exception', 'error': str(error)}
+    return {'name': name, 'return_status': solver.stats()['return_status'],
+            'x': np.array(result['x']).ravel(), 'f': float(result['f']),
+            'lam_g': np.array(result['lam_g']).ravel(),
+            'lam_x': np.array(result['lam_x']).ravel()}
+
 
 class Problem(OptiChild, PlotLayer):
 
@@ -37,6 +69,8 @@ class Problem(OptiChild, PlotLayer):
         self.set_options(options)
         self.iteration = 0
         self.update_times = []
+        self.trigger_stats = {'updates': 0, 'skipped': 0, 'consecutive': 0}
+        self.pool = None
 
         # first add children and construct father, this allows making a
         # difference between the simulated and the processed vehicles,
@@ -52,14 +86,50 @@ class Problem(OptiChild, PlotLayer):
     # ========================================================================
 
     def set_default_options(self):
-        self.options = {'verbose': 2}
+        self.options = {'verbose': 2, 'profile': False, 'dual_warm_start': True}
+        # wall clock budget of an update in seconds, when it runs out the
+        # best feasible iterate or a fallback trajectory is used
+        self.options['deadline'] = None
+        self.options['feasibility_tol'] = 1e-4
+        # SolutionLibrary to warm start the first update from the nearest
+        # stored solution, and to store converged first updates in
+        self.options['library'] = None
+        self.options['library_store'] = True
+        # race several initial guesses on the first update, see starts
+        self.options['multistart'] = False
+        self.options['starts'] = {'guesses': ['astar', 'detour'],
+                                  'processes': None, 'race': True,
+                                  'max_starts': 8, 'astar_cells': [20, 20],
+                                  'homotopy': False, 'homotopy_offset': 100.}
+        # event-triggered mpc: keep the shifted solution as long as its
+        # constraint violation at the new state and obstacle positions stays
+        # below tol and the gradient of its lagrangian below
+        # stationarity_tol, for at most max_skips updates in a row. FreeT
+        # Point2point problems never skip: their initial velocity constraint
+        # uses the horizon parameter T, which they leave unset.
+        self.options['event_triggered'] = False
+        self.options['trigger'] = {'tol': 1e-3, 'stationarity_tol': 0.5,
+                                   'max_skips': None}
         self.options['solver'] = 'ipopt'
         ipopt_options = {'ipopt.tol': 1e-3,
                          'ipopt.warm_start_init_point': 'yes',
                          'ipopt.print_level': 0, 'print_time': 0,
                          'ipopt.fixed_variable_treatment':'make_constraint'}
         self.options['solver_options'] = {'ipopt': ipopt_options}
-        self.options['codegen'] = {'build': None, 'flags': '-O0'}
+        # reuse: share the solver of structurally identical nlps, which pays
+        # off for problems that are rebuilt often (e.g. per scheduler frame).
+        # Its key hashes the generated c code of the nlp, which is costly
+        # for a problem that is built once.
+        self.options['codegen'] = {'build': None, 'flags': '-O0',
+                                   'function_flags': None, 'jobs': None,
+                                   'cache': False, 'cache_dir': None,
+                                   'cache_size': 20, 'reuse': False}
+        # 'nlp': solve each update to convergence, 'rti': real-time
+        # iterations, i.e. a few qp steps per update
+        self.options['solve_mode'] = 'nlp'
+        self.options['rti'] = {'iterations': 1, 'qpsol': 'qpoases',
+                               'qpsol_options': {'printLevel': 'none'},
+                               'regularization': 1e-6, 'tol': 1e-6}
 
     def set_options(self, options):
         if 'solver_options' in options:
@@ -69,8 +139,15 @@ class Problem(OptiChild, PlotLayer):
                 self.options['solver_options'][key].update(value)
         if 'codegen' in options:
             self.options['codegen'].update(options['codegen'])
+        if 'rti' in options:
+            self.options['rti'].update(options['rti'])
+        if 'starts' in options:
+            self.options['starts'].update(options['starts'])
+        if 'trigger' in options:
+            self.options['trigger'].update(options['trigger'])
         for key in options:
-            if key not in ['solver_options', 'codegen']:
+            if key not in ['solver_options', 'codegen', 'rti', 'starts',
+                           'trigger']:
                 self.options[key] = options[key]
 
     # ========================================================================
@@ -84,12 +161,32 @@ class Problem(OptiChild, PlotLayer):
 
     def init(self):
         self.father.reset()
+        # room geometry as parameters only pays off when solvers are reused
+        for vehicle in self.vehicles:
+            vehicle.room_parameters = self.options['codegen']['reuse']
+        t0 = time.time()
         self.construct()
+        if self.options['profile']:
+            print 'Problem construction in %5f s' % (time.time()-t0)
         self.problem, buildtime = self.father.construct_problem(self.options)
+        if self.options['solve_mode'] == 'rti':
+            self.rti, rti_buildtime = self.father.construct_rti(self.options)
+            buildtime += rti_buildtime
+        self.rti_prepared = None
         self.father.init_transformations(self.init_primal_transform,
                                          self.init_dual_transform)
+        # workers inherit the solver, so they are made after building it
+        self.close_pool()
+        self.multistart_pool()
         return buildtime
 
+    def warm_start_duals(self):
+        # multipliers only help when the hessian is exact: a limited-memory
+        # hessian restarts from scratch and takes more iterations with them
+        solver_options = self.options['solver_options'].get(self.options['solver'], {})
+        return (self.options['dual_warm_start'] and
+                solver_options.get('ipopt.hessian_approximation') != 'limited-memory')
+
     # ========================================================================
     # Deploying related functions
     # ========================================================================
@@ -99,33 +196,20 @@ class Problem(OptiChild, PlotLayer):
             father = self.father
         father.init_variables()
         father.init_parameters()
+        self.multistart_pool()
 
-    def solve(self, current_time, update_time):
+    def solve(self, current_time, update_time, deadline=None):
         current_time -= self.start_time  # start_time: the point in time where you start solving
-        self.init_step(current_time, update_time)  # pass on update_time to make initial guess
-        # set initial guess, parameters, lb & ub
-        var = self.father.get_variables()
-        dual_var = self.father.get_dual_variables()
-        par = self.father.set_parameters(current_time)
-        lb, ub = self.father.update_bounds(current_time)
-        # solve!
-        t0 = time.time()
-        result = self.problem(x0=var, p=par, lbg=lb, ubg=ub)
-        # result = self.problem(x0=var, lam_g0= dual_var, p=par, lbg=lb, ubg=ub)
-        t1 = time.time()
-        t_upd = t1-t0
-        self.father.set_variables(result['x'])
-        self.father.set_dual_variables(result['lam_g'])
-        stats = self.problem.stats()
-        if stats['return_status'] != 'Solve_Succeeded':
-            if stats['return_status'] == 'Maximum_CpuTime_Exceeded':
-                if current_time != 0.0:  # first iteration can be slow, neglect time here
-                    print 'Maximum solving time exceeded, resetting initial guess'
-                    self.reset_init_guess()
-                    print stats['return_status']
-            else:
-                # there was another problem
-                print stats['return_status']
+        if deadline is None:
+            deadline = self.options['deadline']
+        if self.options['solve_mode'] == 'rti' and current_time > 0.:
+            # real-time iterations start from the converged first update
+            t_upd, status = self.solve_rti(current_time, update_time)
+        else:
+            t_upd, status = self.solve_nlp(current_time, update_time, deadline)
+        status['time'] = t_upd
+        status['deadline_met'] = None if deadline is None else t_upd <= deadline
+        self.solve_status = status
         if self.options['verbose'] >= 2:
             self.iteration += 1
             if ((self.iteration-1) % 20 == 0):
@@ -134,6 +218,339 @@ class Problem(OptiChild, PlotLayer):
                 print "----|------------|------------"
             print "%3d | %.4e | %.4e " % (self.iteration, t_upd, current_time)
         self.update_times.append(t_upd)
+        return status
+
+    def solve_nlp(self, current_time, update_time, deadline=None):
+        t0 = time.time()
+        monitor = self.father.monitor
+        if deadline is not None and monitor is None:
+            raise ValueError('Set the deadline option before init to solve ' +
+                             'with a deadline.')
+        self.init_step(current_time, update_time)  # pass on update_time to make initial guess
+        # set initial guess, parameters, lb & ub
+        par = self.father.set_parameters(current_time)
+        lb, ub = self.father.update_bounds(current_time)
+        library = self.options['library'] if current_time == 0. else None
+        if library is not None:
+            features = self.library_features(par)
+            distance = self.library_warm_start(features)
+        var = self.father.get_variables()
+        # the update time is the time spent on the trigger check and the
+        # solver, or with a deadline on the update as a whole, both for
+        # skipped and solved updates
+        t_check = 0.
+        if self.options['event_triggered']:
+            t1 = time.time()
+            status = self.trigger(current_time, var, par, lb, ub)
+            t_check = time.time() - t1
+            if status is not None:
+                return (t_check if deadline is None else time.time() - t0), status
+        args = {'x0': var, 'p': par, 'lbg': lb, 'ubg': ub}
+        if self.warm_start_duals():
+            args['lam_g0'] = self.father.get_dual_variables()
+            args['lam_x0'] = self.father.get_bound_dual_variables()
+        if monitor is not None:
+            monitor.start(None if deadline is None else t0+deadline, lb, ub,
+                          self.options['feasibility_tol'])
+        # solve!
+        t1 = time.time()
+        if self.options['multistart'] and current_time == 0.:
+            result = self.solve_multistart(args)
+            status = {'return_status': result['return_status'],
+                      'start': result['name']}
+        else:
+            result = self.problem(**args)
+            status = {'return_status': self.problem.stats()['return_status']}
+        if status['return_status'] in ['Solve_Succeeded', 'Solved_To_Acceptable_Level']:
+            status.update({'source': 'solution', 'feasible': True})
+            self.father.set_variables(result['x'])
+        else:
+            # the solver stopped early: take the best feasible iterate, or
+            # else the last iterate or the guess, i.e. the shifted previous
+            # solution, whichever is feasible
+            candidates = [('iterate', result['x']), ('shifted', var)]
+            if monitor is not None and monitor.best is not None:
+                candidates.insert(0, ('iterate', monitor.best))
+            status.update(self.fallback(candidates, par, lb, ub))
+            print '%s, using the %s solution' % (status['return_status'],
+                                                 status['source'])
+        if status['source'] != 'shifted':
+            self.father.set_dual_variables(result['lam_g'])
+            self.father.set_bound_dual_variables(result['lam_x'])
+        if library is not None:
+            status['library_distance'] = distance
+            if self.options['library_store'] and status['source'] == 'solution':
+                library.add(features, result['x'], result['lam_g'],
+                            result['lam_x'])
+        if deadline is None:
+            t_upd = time.time() - t1 + t_check
+        else:
+            t_upd = time.time() - t0
+        return t_upd, status
+
+    def multistart_pool(self):
+        # worker processes for the multi-start solve, made once and reused
+        # by later solves. They inherit the solver. None: solve serially,
+        # also in a worker process of solve_batch (which has no children).
+        if not self.options['multistart'] or not hasattr(self, 'problem'):
+            return None
+        if self.pool is not None and self.pool[1] == os.getpid():
+            return self.pool[0]
+        options = self.options['starts']
+        processes = min(options['processes'] or multiprocessing.cpu_count(),
+                        options['max_starts'] - 1)
+        if processes <= 1 or multiprocessing.current_process().daemon:
+            return None
+        pool = multiprocessing.Pool(processes, _init_multistart, (self.problem,))
+        self.pool = (pool, os.getpid())
+        return pool
+
+    def close_pool(self):
+        if self.pool is not None and self.pool[1] == os.getpid():
+            self.pool[0].terminate()
+            self.pool[0].join()
+        self.pool = None
+
+    def solve_multistart(self, args):
+        # solve from the current variables first. Only when that fails (or
+        # without race) the other initial guesses are generated and solved,
+        # in the worker processes of multistart_pool. With race, the first
+        # converged start wins, otherwise the converged start with the
+        # lowest objective. When none converges, the least violating iterate
+        # is returned.
+        options = self.options['starts']
+        x0 = np.array(args['x0'].cat).ravel()
+        duals = None
+        if 'lam_g0' in args:
+            duals = (np.array(args['lam_g0'].cat).ravel(),
+                     np.array(args['lam_x0'].cat).ravel())
+        shared = {'p': np.array(args['p']).ravel(),
+                  'lbg': np.array(args['lbg'], dtype=float).ravel(),
+                  'ubg': np.array(args['ubg'], dtype=float).ravel()}
+        converged = ['Solve_Succeeded', 'Solved_To_Acceptable_Level']
+        _init_multistart(self.problem)
+        results = [_solve_start(('initial', x0, duals, [], shared))]
+
+        def generate_starts():
+            # guesses are generated lazily: a serial race stops early
+            if options['homotopy']:
+                stages = self.homotopy_parameters(args['p'])
+                if stages:
+                    yield ('homotopy', x0, None, stages, shared)
+            for name, guess in islice(self.get_init_guesses(x0), 1, None):
+                yield (name, guess, None, [], shared)
+        if not (options['race'] and results[0]['return_status'] in converged):
+            starts = islice(generate_starts(), options['max_starts'] - 1)
+            pool = self.multistart_pool()
+            if pool is None:
+                for start in starts:
+                    results.append(_solve_start(start))
+                    if options['race'] and results[-1]['return_status'] in converged:
+                        break
+            else:
+                # the guesses are made here: they use the variables of father
+                done = False
+                try:
+                    for result in pool.imap_unordered(_solve_start, list(starts)):
+                        results.append(result)
+                        if options['race'] and result['return_status'] in converged:
+                            break
+                    else:
+                        done = True
+                finally:
+                    if not done:
+                        # stop the starts which are still running, the
+                        # pool is made again at reinitialize
+                        self.close_pool()
+        if self.options['verbose'] >= 1:
+            for result in results:
+                print 'start %s: %s' % (result['name'], result['return_status'])
+        solved = [r for r in results if r['return_status'] in converged]
+        if solved:
+            result = solved[0] if options['race'] else min(solved, key=lambda r: r['f'])
+        else:
+            results = [r for r in results if 'x' in r]
+            if not results:
+                raise RuntimeError('All starts of the multi-start solve failed.')
+            violations = [self.father.constraint_violation(
+                r['x'], args['p'], args['lbg'], args['ubg']) for r in results]
+            result = results[int(np.argmin(violations))]
+        for key in ['x', 'lam_g', 'lam_x']:
+            result[key] = DM(result[key])
+        return result
+
+    def get_init_guesses(self, variables):
+        # named initial guesses of the multi-start solve, the current
+        # variables come first
+        yield ('initial', variables)
+
+    def homotopy_parameters(self, par):
+        # parameter vectors which introduce the obstacles one by one, nearest
+        # to the vehicles first: obstacles that are not introduced yet are
+        # moved away by homotopy_offset
+        par = np.array(par).ravel()
+        position = np.mean([vehicle.prediction['state'][:vehicle.n_dim]
+                            for vehicle in self.vehicles], axis=0)
+        indices = []
+        for obstacle in self.environment.obstacles:
+            if obstacle.options['avoid'] and 'x' in obstacle._parameters:
+                index = self.father.parameter_index(obstacle, 'x')
+                distance = np.linalg.norm(par[index] - position[:len(index)])
+                indices.append((distance, index))
+        indices = [index for _, index in sorted(indices, key=lambda d: d[0])]
+        stages = []
+        for k in range(len(indices)):
+            stage = par.copy()
+            for index in indices[k:]:
+                stage[index] += self.options['starts']['homotopy_offset']
+            stages.append(stage)
+        return stages
+
+    def library_features(self, par):
+        # the parameters of the first update hold the initial and terminal
+        # conditions and the obstacle states
+        return np.array(par).ravel()
+
+    def library_warm_start(self, features):
+        # initial guess from the nearest stored solution, returns its
+        # distance or None when there is none
+        solution = self.options['library'].query(features)
+        if solution is None:
+            return None
+        self.father.set_variables(solution['variables'])
+        if (self.warm_start_duals() and solution['duals'] is not None and
+                solution['bound_duals'] is not None):
+            self.father.set_dual_variables(solution['duals'])
+            self.father.set_bound_dual_variables(solution['bound_duals'])
+        return solution['distance']
+
+    def trigger(self, current_time, variables, par, lb, ub):
+        # returns the status of a skipped update, or None when the solver
+        # has to run: on the first update, after max_skips skipped updates,
+        # when the shifted solution violates the constraints, e.g. because
+        # the state deviates from it or an obstacle moved, or when it is far
+        # from stationary
+        stats, options = self.trigger_stats, self.options['trigger']
+        if current_time == 0.:
+            stats.update({'updates': 0, 'skipped': 0, 'consecutive': 0})
+        stats['updates'] += 1
+        if (current_time > 0. and (options['max_skips'] is None or
+                                   stats['consecutive'] < options['max_skips'])):
+            violation = self.father.constraint_violation(variables, par, lb, ub)
+            if violation <= options['tol']:
+                # a feasible shifted solution can still be far from optimal
+                stationarity = self.father.stationarity(
+                    variables, par, self.father.get_dual_variables(),
+                    self.father.get_bound_dual_variables())
+                if (options['stationarity_tol'] is None or
+                        stationarity <= options['stationarity_tol']):
+                    stats['skipped'] += 1
+                    stats['consecutive'] += 1
+                    return {'return_status': 'Skipped', 'source': 'shifted',
+                            'feasible': True, 'violation': violation,
+                            'stationarity': stationarity}
+        stats['consecutive'] = 0
+        return None
+
+    def fallback(self, candidates, par, lb, ub):
+        # first candidate that satisfies the constraints, otherwise the one
+        # that violates them least
+        violations = []
+        for source, variables in candidates:
+            violation = self.father.constraint_violation(variables, par, lb, ub)
+            if violation <= self.options['feasibility_tol']:
+                self.father.set_variables(variables)
+                return {'source': source, 'feasible': True, 'violation': violation}
+            violations.append(violation)
+        k = int(np.argmin(violations))
+        self.father.set_variables(candidates[k][1])
+        return {'source': candidates[k][0], 'feasible': False,
+                'violation': violations[k]}
+
+    def prepare(self, current_time, update_time):
+        # preparation phase of a real-time iteration, done before the state
+        # of the update at current_time is known: shift the guess to that
+        # update and linearize the problem around it
+        if self.options['solve_mode'] != 'rti':
+            return
+        current_time -= self.start_time
+        self.init_step(current_time, update_time)
+        par = self.father.set_parameters(current_time)
+        lb, ub = self.father.update_bounds(current_time)
+        self.rti_linearize(par)
+        # a qp solved with the parameters known so far warm starts the
+        # active set of the qp at feedback time
+        self.rti_qp(par, lb, ub)
+        self.rti_prepared = current_time
+
+    def solve_rti(self, current_time, update_time):
+        if self.rti_prepared is None:
+            self.init_step(current_time, update_time)
+        # only the parameters at feedback time are new: the state and the
+        # obstacle positions enter the constraint values and the gradient
+        par = self.father.set_parameters(current_time)
+        lb, ub = self.father.update_bounds(current_time)
+        t0 = time.time()
+        status = {'return_status': 'Real_Time_Iteration', 'source': 'solution',
+                  'feasible': True}
+        for k in range(self.options['rti']['iterations']):
+            if k > 0 or self.rti_prepared != current_time:
+                self.rti_linearize(par)
+            result = self.rti_qp(par, lb, ub)
+            if result is None:
+                if k == 0:
+                    status['return_status'] = 'Step_Rejected'
+                    status.update(self.fallback(
+                        [('shifted', self.father.get_variables())], par, lb, ub))
+                print 'Real-time iteration step rejected'
+                break
+            self.father.set_variables(result[0])
+            self.father.set_dual_variables(result[1])
+        t1 = time.time()
+        self.rti_prepared = None
+        return t1-t0, status
+
+    def rti_linearize(self, par):
+        var = self.father.get_variables()
+        lam = self.father.get_dual_variables()
+        hess, jac = self.rti['prepare'].call([var, par, lam])
+        # the qp requires a convex hessian: mirror its negative eigenvalues,
+        # per diagonal block. A block which passes a cholesky factorization
+        # after subtracting the regularization is kept as it is.
+        reg = self.options['rti']['regularization']
+        hess = hess.full()
+        blocks = self.rti['blocks']
+        single = blocks['single']
+        hess[single, single] = np.maximum(np.abs(hess[single, single]), reg)
+        for block in blocks['coupled']:
+            sub = hess[np.ix_(block, block)]
+            try:
+                np.linalg.cholesky(sub - reg*np.eye(len(block)))
+            except np.linalg.LinAlgError:
+                eig, vec = np.linalg.eigh(sub)
+                eig = np.maximum(np.abs(eig), reg)
+                hess[np.ix_(block, block)] = vec.dot(np.diag(eig)).dot(vec.T)
+        self.rti_linearization = {'h': hess, 'a': jac}
+
+    def rti_qp(self, par, lb, ub):
+        var = self.father.get_variables()
+        grad, con = self.rti['feedback'].call([var, par])
+        con = np.array(con).ravel()
+        lba, uba = np.array(lb).ravel() - con, np.array(ub).ravel() - con
+        try:
+            result = self.rti['qp'](h=self.rti_linearization['h'], g=grad,
+                                    a=self.rti_linearization['a'],
+                                    lba=lba, uba=uba, lbx=-inf, ubx=inf)
+        except RuntimeError:  # infeasible linearization
+            return None
+        step = np.array(result['x']).ravel()
+        # a qp interrupted by its working set or cpu time limit returns an
+        # infeasible step, which is dropped as well
+        lin_con = np.array(mtimes(self.rti_linearization['a'], step)).ravel()
+        violation = max(np.max(lba - lin_con), np.max(lin_con - uba), 0.)
+        if violation > self.options['rti']['tol']:
+            return None
+        return np.array(var.cat).ravel() + step, result['lam_a']
 
     def predict(self, current_time, predict_time, sample_time, states=None, inputs=None, dinputs=None, delay=0, enforce_states=False, enforce_inputs=False):
         if states is None:
@@ -200,8 +617,7 @@ class Problem(OptiChild, PlotLayer):
             spline_values = [self.father.get_variables(
                 vehicle, 'splines_seg'+str(k), spline=False)[-1, :] for k in range(vehicle.n_seg)]
             for segment, values in zip(spline_segments, spline_values):
-                for spl, value in zip(segment, values):
-                    spl.coeffs = value*np.ones(len(spl.basis))
+                segment.coeffs[:] = values
             vehicle.store(current_time, sample_time, spline_segments, sleep_time)
         # no correction for update time!
         Problem.simulate(self, current_time, sleep_time, sample_time)
@@ -720,7 +720,9 @@ class SchedulerProblem(Problem):
             problem = Point2point(self.vehicles, environment, freeT=self.problem_options['freeT'], options=problem_options)
         else:
             problem = MultiFrameProblem(self.vehicles, environment, n_frames=self.n_frames)
-        problem.set_options({'solver_options': self.options['solver_options']})
+        # frames are rebuilt often and mostly share their structure
+        problem.set_options({'solver_options': self.options['solver_options'],
+                             'codegen': {'reuse': True}})
         problem.init()
         # reset the current_time, to ensure that predict uses the provided
         # last input of previous problem and vehicle velocity is kept from one frame to another
@@ -256,12 +256,9 @@ class AGV(Vehicle):
             dx_int, dy_int = running_integral(dx), running_integral(dy)  # current state
             x = dx_int - dx_int(time[0]) + self.signals['state'][0, -1]
             y = dy_int - dy_int(time[0]) + self.signals['state'][1, -1]
-        # sample splines
-        tg_ha = np.array(sample_splines([tg_ha], time))
-        v_til = np.array(sample_splines([v_til], time))
-        dtg_ha = np.array(sample_splines([dtg_ha], time))
-        dv_til = np.array(sample_splines([dv_til], time))
-        ddtg_ha = np.array(sample_splines([ddtg_ha], time))
+        # sample all signals at once
+        samples = sample_splines([tg_ha, v_til, dtg_ha, dv_til, ddtg_ha, x, y], time)
+        tg_ha, v_til, dtg_ha, dv_til, ddtg_ha = [np.atleast_2d(s) for s in samples[:5]]
         theta = 2*np.arctan2(tg_ha, 1)
         delta = np.arctan2(-2*dtg_ha*self.length, v_til*(1+tg_ha**2)**2)
         ddelta = -(2*ddtg_ha*self.length*(v_til*(1+tg_ha**2)**2)-2*dtg_ha*self.length*(dv_til*(1+tg_ha**2)**2 + v_til*(4*tg_ha+4*tg_ha**3)*dtg_ha))/(v_til**2*(1+tg_ha**2)**4+(2*dtg_ha*self.length)**2)
@@ -284,7 +281,7 @@ class AGV(Vehicle):
             ddelta[0, -1] = ddelta[0, -2]
         input = np.c_[v_til*(1+tg_ha**2)]  # V
         input = np.r_[input, ddelta]
-        signals['state'] = np.c_[sample_splines([x, y], time)]
+        signals['state'] = np.c_[samples[5:7]]
         signals['state'] = np.r_[signals['state'], theta, delta]
         signals['input'] = input
         signals['pose'] = signals['state'][:3]
@@ -306,12 +306,28 @@ class Bicycle(Vehicle):
             # dx_int, dy_int = running_integral(dx), running_integral(dy)  # current state
             # x = dx_int - dx_int(time[0]) + self.signals['state'][0, -1]
             # y = dy_int - dy_int(time[0]) + self.signals['state'][1, -1]
-        # sample splines
-        tg_ha = np.array(sample_splines([tg_ha], time))
-        v_til = np.array(sample_splines([v_til], time))
-        dtg_ha = np.array(sample_splines([dtg_ha], time))
-        dv_til = np.array(sample_splines([dv_til], time))
-        ddtg_ha = np.array(sample_splines([ddtg_ha], time))
+        splines_s = [tg_ha, v_til, dtg_ha, dv_til, ddtg_ha, x, y]
+        if (self.options['substitution']):# and not self.options['exact_substitution']):  # don't plot error for exact_subs
+            dx2 = self.problem.father.get_variables(self, 'dx')
+            dy2 = self.problem.father.get_variables(self, 'dy')
+            # select horizon_time
+            if isinstance(self.problem, FreeTPoint2point):
+                horizon_time = self.problem.father.get_variables(self.problem, 'T')[0][0]
+            elif isinstance(self.problem, FixedTPoint2point):
+                horizon_time = self.problem.options['horizon_time']
+            dx2 = concat_splines([dx2], [horizon_time])[0]
+            dy2 = concat_splines([dy2], [horizon_time])[0]
+            if not hasattr(self, 'signals'): # first iteration
+                x2 = self.integrate_once(dx2, self.pose0[0], time[0])
+                y2 = self.integrate_once(dy2, self.pose0[1], time[0])
+            else:
+                x2 = self.integrate_once(dx2, self.signals['state'][0, -1], time[0])
+                y2 = self.integrate_once(dy2, self.signals['state'][1, -1], time[0])
+            splines_s += [dx, dy, x2, y2, dx2, dy2]
+        # sample all signals at once
+        samples = sample_splines(splines_s, time)
+        tg_ha, v_til, dtg_ha, dv_til, ddtg_ha = [np.atleast_2d(s) for s in samples[:5]]
+        x_s, y_s = samples[5:7]
         theta = 2*np.arctan2(tg_ha, 1)
         delta = np.arctan2(2*dtg_ha*self.length, v_til*(1+tg_ha**2)**2)
         ddelta = (2*ddtg_ha*self.length*(v_til*(1+tg_ha**2)**2)-2*dtg_ha*self.length*(dv_til*(1+tg_ha**2)**2 + v_til*(4*tg_ha+4*tg_ha**3)*dtg_ha))/(v_til**2*(1+tg_ha**2)**4+(2*dtg_ha*self.length)**2)
@@ -334,30 +350,13 @@ class Bicycle(Vehicle):
             ddelta[0, -1] = ddelta[0, -2]
         input = np.c_[v_til*(1+tg_ha**2)]  # V
         input = np.r_[input, ddelta]
-        x_s, y_s = sample_splines([x, y], time)
         signals['state'] = np.c_[x_s, y_s].T
         signals['state'] = np.r_[signals['state'], theta, delta]
         signals['input'] = input
         signals['delta'] = delta
 
-        if (self.options['substitution']):# and not self.options['exact_substitution']):  # don't plot error for exact_subs
-            dx2 = self.problem.father.get_variables(self, 'dx')
-            dy2 = self.problem.father.get_variables(self, 'dy')
-            # select horizon_time
-            if isinstance(self.problem, FreeTPoint2point):
-                horizon_time = self.problem.father.get_variables(self.problem, 'T')[0][0]
-            elif isinstance(self.problem, FixedTPoint2point):
-                horizon_time = self.problem.options['horizon_time']
-            dx2 = concat_splines([dx2], [horizon_time])[0]
-            dy2 = concat_splines([dy2], [horizon_time])[0]
-            if not hasattr(self, 'signals'): # first iteration
-                x2 = self.integrate_once(dx2, self.pose0[0], time[0])
-                y2 = self.integrate_once(dy2, self.pose0[1], time[0])
-            else:
-                x2 = self.integrate_once(dx2, self.signals['state'][0, -1], time[0])
-                y2 = self.integrate_once(dy2, self.signals['state'][1, -1], time[0])
-            dx_s, dy_s = sample_splines([dx, dy], time)
-            x_s2, y_s2, dx_s2, dy_s2 = sample_splines([x2, y2, dx2, dy2], time)
+        if (self.options['substitution']):
+            dx_s, dy_s, x_s2, y_s2, dx_s2, dy_s2 = samples[-6:]
             signals['err_dpos'] = np.c_[dx_s-dx_s2, dy_s-dy_s2].T
             signals['err_pos'] = np.c_[x_s-x_s2, y_s-y_s2].T
         return signals
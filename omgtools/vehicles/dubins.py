@@ -281,22 +281,12 @@ class Dubins(Vehicle):
         else:
             x = self.integrate_once(dx, self.signals['state'][0, -1], time[0])
             y = self.integrate_once(dy, self.signals['state'][1, -1], time[0])
-        x_s, y_s, v_til_s, tg_ha_s, dtg_ha_s = sample_splines([x, y, v_til, tg_ha, dtg_ha], time)
-        den = sample_splines([(1+tg_ha**2)], time)[0]
-        theta = 2*np.arctan2(tg_ha_s,1)
-        dtheta = 2*np.array(dtg_ha_s)/(1.+np.array(tg_ha_s)**2)
-        v_s = v_til_s*den
-        acc = v_til*(1+tg_ha**2)
-        acc = acc.derivative()
-        acc_s = sample_splines([acc], time)[0]
-        signals['state'] = np.c_[x_s, y_s, theta.T].T
-        signals['input'] = np.c_[v_s, dtheta.T].T
-        signals['acc'] = np.c_[acc_s].T
+        den = 1+tg_ha**2
+        acc = (v_til*den).derivative()
+        splines_s = [x, y, v_til, tg_ha, dtg_ha, den, acc]
         if hasattr(self, 'rel_pos_c'):
-            x_c = x_s + sample_splines([self.rel_pos_c[0]*2*tg_ha + self.rel_pos_c[1]*(1-tg_ha**2)], time)[0]/den
-            y_c = y_s + sample_splines([self.rel_pos_c[1]*2*tg_ha - self.rel_pos_c[0]*(1-tg_ha**2)], time)[0]/den
-            signals['fleet_center'] = np.c_[x_c, y_c].T
-
+            splines_s += [self.rel_pos_c[0]*2*tg_ha + self.rel_pos_c[1]*(1-tg_ha**2),
+                          self.rel_pos_c[1]*2*tg_ha - self.rel_pos_c[0]*(1-tg_ha**2)]
         if (self.options['substitution']): # and not self.options['exact_substitution']):  # don't plot error for exact_subs
             dx2 = self.problem.father.get_variables(self, 'dx')
             dy2 = self.problem.father.get_variables(self, 'dy')
@@ -313,8 +303,23 @@ class Dubins(Vehicle):
             else:
                 x2 = self.integrate_once(dx2, self.signals['state'][0, -1], time[0])
                 y2 = self.integrate_once(dy2, self.signals['state'][1, -1], time[0])
-            dx_s, dy_s = sample_splines([dx, dy], time)
-            x_s2, y_s2, dx_s2, dy_s2 = sample_splines([x2, y2, dx2, dy2], time)
+            splines_s += [dx, dy, x2, y2, dx2, dy2]
+        # sample all signals at once
+        samples = sample_splines(splines_s, time)
+        x_s, y_s, v_til_s, tg_ha_s, dtg_ha_s, den_s, acc_s = samples[:7]
+        theta = 2*np.arctan2(tg_ha_s,1)
+        dtheta = 2*np.array(dtg_ha_s)/(1.+np.array(tg_ha_s)**2)
+        v_s = v_til_s*den_s
+        signals['state'] = np.c_[x_s, y_s, theta.T].T
+        signals['input'] = np.c_[v_s, dtheta.T].T
+        signals['acc'] = np.c_[acc_s].T
+        if hasattr(self, 'rel_pos_c'):
+            x_c = x_s + samples[7]/den_s
+            y_c = y_s + samples[8]/den_s
+            signals['fleet_center'] = np.c_[x_c, y_c].T
+
+        if (self.options['substitution']):
+            dx_s, dy_s, x_s2, y_s2, dx_s2, dy_s2 = samples[-6:]
             signals['err_dpos'] = np.c_[dx_s-dx_s2, dy_s-dy_s2].T
             signals['err_pos'] = np.c_[x_s-x_s2, y_s-y_s2].T
 
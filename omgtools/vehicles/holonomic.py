@@ -167,11 +167,13 @@ class Holonomic(Vehicle):
         x, y = splines[0], splines[1]
         dx, dy = x.derivative(), y.derivative()
         ddx, ddy = x.derivative(2), y.derivative(2)
-        input = np.c_[sample_splines([dx, dy], time)]
-        signals['state'] = np.c_[sample_splines([x, y], time)]
+        x_s, y_s, dx_s, dy_s, ddx_s, ddy_s = sample_splines(
+            [x, y, dx, dy, ddx, ddy], time)
+        input = np.c_[dx_s, dy_s].T
+        signals['state'] = np.c_[x_s, y_s].T
         signals['input'] = input
         signals['v_tot'] = np.sqrt(input[0, :]**2 + input[1, :]**2)
-        signals['dinput'] = np.c_[sample_splines([ddx, ddy], time)]
+        signals['dinput'] = np.c_[ddx_s, ddy_s].T
         return signals
 
     def state2pose(self, state):
@@ -104,9 +104,10 @@ class Holonomic1D(Vehicle):
         signals = {}
         x = splines[0]
         dx, ddx = x.derivative(), x.derivative(2)
-        signals['state'] = np.c_[sample_splines(x, time)].T
-        signals['input'] = np.c_[sample_splines(dx, time)].T
-        signals['a'] = np.c_[sample_splines(ddx, time)].T
+        x_s, dx_s, ddx_s = sample_splines([x, dx, ddx], time)
+        signals['state'] = np.c_[x_s].T
+        signals['input'] = np.c_[dx_s].T
+        signals['a'] = np.c_[ddx_s].T
         return signals
 
     def state2pose(self, state):
@@ -137,12 +137,13 @@ class Holonomic3D(Vehicle):
         x, y, z = splines[0], splines[1], splines[2]
         dx, dy, dz = x.derivative(), y.derivative(), z.derivative()
         ddx, ddy, ddz = x.derivative(2), y.derivative(2), z.derivative(2)
-        input = np.c_[sample_splines([dx, dy, dz], time)]
-        signals['state'] = np.c_[sample_splines([x, y, z], time)]
+        samples = sample_splines([x, y, z, dx, dy, dz, ddx, ddy, ddz], time)
+        input = np.c_[samples[3:6]]
+        signals['state'] = np.c_[samples[0:3]]
         signals['input'] = input
         signals['v_tot'] = np.sqrt(
             input[0, :]**2 + input[1, :]**2 + input[2, :]**2)
-        signals['a'] = np.c_[sample_splines([ddx, ddy, ddz], time)]
+        signals['a'] = np.c_[samples[6:9]]
         return signals
 
     def state2pose(self, state):
@@ -164,16 +164,19 @@ class HolonomicOrient(Vehicle):
         signals = {}
         x, y, tg_ha = splines[0], splines[1], splines[2]
         dx, dy, dtg_ha = x.derivative(), y.derivative(), tg_ha.derivative()
-        theta = 2*np.arctan2(sample_splines([tg_ha], time),1)
-        dtheta = 2*np.array(sample_splines([dtg_ha],time))/(1+np.array(sample_splines([tg_ha], time))**2)
         ddx, ddy = x.derivative(2), y.derivative(2)
-        input = np.c_[sample_splines([dx, dy], time)]
+        (x_s, y_s, tg_ha_s, dx_s, dy_s, dtg_ha_s,
+         ddx_s, ddy_s) = sample_splines([x, y, tg_ha, dx, dy, dtg_ha,
+                                         ddx, ddy], time)
+        theta = 2*np.arctan2(np.c_[tg_ha_s].T, 1)
+        dtheta = 2*np.c_[dtg_ha_s].T/(1+np.c_[tg_ha_s].T**2)
+        input = np.c_[dx_s, dy_s].T
         input = np.r_[input,dtheta]
-        signals['state'] = np.c_[sample_splines([x, y], time)]
+        signals['state'] = np.c_[x_s, y_s].T
         signals['state'] = np.r_[signals['state'], theta]
         signals['input'] = input
         signals['v_tot'] = np.sqrt(input[0, :]**2 + input[1, :]**2)
-        signals['a'] = np.c_[sample_splines([ddx, ddy], time)]
+        signals['a'] = np.c_[ddx_s, ddy_s].T
         return signals
 
     def state2pose(self, state):
@@ -128,10 +128,9 @@ class Quadrotor(Vehicle):
         ddx, ddy = x.derivative(2), y.derivative(2)
         dddx, dddy = x.derivative(3), y.derivative(3)
 
-        x_s, y_s = sample_splines([x, y], time)
-        dx_s, dy_s = sample_splines([dx, dy], time)
-        ddx_s, ddy_s = sample_splines([ddx, ddy], time)
-        dddx_s, dddy_s = sample_splines([dddx, dddy], time)
+        (x_s, y_s, dx_s, dy_s, ddx_s, ddy_s,
+         dddx_s, dddy_s) = sample_splines([x, y, dx, dy, ddx, ddy,
+                                           dddx, dddy], time)
 
         theta = np.arctan2(ddx_s, ddy_s + self.g)
         u1 = np.sqrt(ddx_s**2 + (ddy_s + self.g)**2)
@@ -263,17 +263,8 @@ class Quadrotor3D(Vehicle):
         y, dy = self.integrate_twice(ddy, self.prediction['state'][4], self.prediction['state'][1], time[0])
         z, dz = self.integrate_twice(ddz, self.prediction['state'][5], self.prediction['state'][2], time[0])
 
-        x_s, y_s, z_s, dx_s, dy_s, dz_s = sample_splines([x, y, z, dx, dy, dz], time)
-        f_til_s, q_phi_s, q_theta_s, dq_phi_s, dq_theta_s = sample_splines([f_til, q_phi, q_theta, dq_phi, dq_theta], time)
-        den = sample_splines([(1+q_phi**2)*(1+q_theta**2)], time)[0]
-        phi = 2*np.arctan2(q_phi_s, 1)
-        theta = 2*np.arctan2(q_theta_s, 1)
-        dphi = 2*np.array(dq_phi_s)/(1.+np.array(q_phi_s)**2)
-        dtheta = 2*np.array(dq_theta_s)/(1.+np.array(q_theta_s)**2)
-        f_s = f_til_s*den
-        signals['state'] = np.c_[x_s, y_s, z_s, dx_s, dy_s, dz_s, phi, theta].T
-        signals['input'] = np.c_[f_s, dphi.T, dtheta.T].T
-
+        splines_s = [x, y, z, dx, dy, dz, f_til, q_phi, q_theta, dq_phi,
+                     dq_theta, (1+q_phi**2)*(1+q_theta**2)]
         if (self.options['substitution'] and not self.options['exact_substitution']):  # don't plot error for exact_subs
             ddx2 = self.problem.father.get_variables(self, 'ddx')
             ddy2 = self.problem.father.get_variables(self, 'ddy')
@@ -286,9 +277,23 @@ class Quadrotor3D(Vehicle):
             y2, dy2 = self.integrate_twice(ddy2, self.prediction['state'][4], self.prediction['state'][1], time[0])
             z2, dz2 = self.integrate_twice(ddz2, self.prediction['state'][5], self.prediction['state'][2], time[0])
 
-            ddx_s, ddy_s, ddz_s = sample_splines([ddx, ddy, ddz], time)
-            ddx_s2, ddy_s2, ddz_s2 = sample_splines([ddx2, ddy2, ddz2], time)
-            x_s2, y_s2, z_s2, dx_s2, dy_s2, dz_s2 = sample_splines([x2, y2, z2, dx2, dy2, dz2], time)
+            splines_s += [ddx, ddy, ddz, ddx2, ddy2, ddz2,
+                          x2, y2, z2, dx2, dy2, dz2]
+        # sample all signals at once
+        samples = sample_splines(splines_s, time)
+        x_s, y_s, z_s, dx_s, dy_s, dz_s = samples[:6]
+        f_til_s, q_phi_s, q_theta_s, dq_phi_s, dq_theta_s, den = samples[6:12]
+        phi = 2*np.arctan2(q_phi_s, 1)
+        theta = 2*np.arctan2(q_theta_s, 1)
+        dphi = 2*np.array(dq_phi_s)/(1.+np.array(q_phi_s)**2)
+        dtheta = 2*np.array(dq_theta_s)/(1.+np.array(q_theta_s)**2)
+        f_s = f_til_s*den
+        signals['state'] = np.c_[x_s, y_s, z_s, dx_s, dy_s, dz_s, phi, theta].T
+        signals['input'] = np.c_[f_s, dphi.T, dtheta.T].T
+
+        if (self.options['substitution'] and not self.options['exact_substitution']):  # don't plot error for exact_subs
+            ddx_s, ddy_s, ddz_s, ddx_s2, ddy_s2, ddz_s2 = samples[12:18]
+            x_s2, y_s2, z_s2, dx_s2, dy_s2, dz_s2 = samples[18:24]
             signals['err_ddpos'] = np.c_[ddx_s-ddx_s2, ddy_s-ddy_s2, ddz_s-ddz_s2].T
             signals['err_dpos'] = np.c_[dx_s-dx_s2, dy_s-dy_s2, dz_s-dz_s2].T
             signals['err_pos'] = np.c_[x_s-x_s2, y_s-y_s2, z_s-z_s2].T
@@ -171,10 +171,10 @@ class SimpleQuadrotor3D(Vehicle):
         ddx, ddy, ddz = x.derivative(2), y.derivative(2), z.derivative(2)
         dddx, dddy, dddz = x.derivative(3), y.derivative(3), z.derivative(3)
 
-        x_s, y_s, z_s = sample_splines([x, y, z], time)
-        dx_s, dy_s, dz_s = sample_splines([dx, dy, dz], time)
-        ddx_s, ddy_s, ddz_s = sample_splines([ddx, ddy, ddz], time)
-        dddx_s, dddy_s, dddz_s = sample_splines([dddx, dddy, dddz], time)
+        (x_s, y_s, z_s, dx_s, dy_s, dz_s, ddx_s, ddy_s, ddz_s,
+         dddx_s, dddy_s, dddz_s) = sample_splines([x, y, z, dx, dy, dz,
+                                                   ddx, ddy, ddz,
+                                                   dddx, dddy, dddz], time)
         phi = np.arctan2(-ddy_s, np.sqrt(ddx_s**2 + (ddz_s + self.g)**2))
         theta = np.arctan2(ddx_s, ddz_s + self.g)
 
@@ -198,10 +198,11 @@ class Tool(Vehicle):
             lims = segment['shape'].get_canvas_limits()
             room_limits = []
             room_limits += [lims[k]+segment['pose'][k] for k in range(self.n_dim)]
+            room_limits = self.define_room_parameter('room_limits', room_limits)
             for chck in checkpoints:
                 for k in range(2):
-                    self.define_constraint(-(chck[k]+position[k]) + room_limits[k][0] + rad[0], -inf, 0.)
-                    self.define_constraint((chck[k]+position[k]) - room_limits[k][1] + rad[0], -inf, 0.)
+                    self.define_constraint(-(chck[k]+position[k]) + room_limits[k, 0] + rad[0], -inf, 0.)
+                    self.define_constraint((chck[k]+position[k]) - room_limits[k, 1] + rad[0], -inf, 0.)
         elif (isinstance(segment['shape'], (Rectangle, Square)) and
             (isinstance(shape, Circle))):
             # we have a diagonal line segment
@@ -218,6 +219,8 @@ class Tool(Vehicle):
             vector = [x2-x1, y2-y1]  # vector from end to start
             a = np.array([-vector[1],vector[0]])*(1/np.sqrt(vector[0]**2+vector[1]**2))  # normalized normal vector
             b = np.dot(a,np.array([x1, y1]))  # offset
+            line = self.define_room_parameter('segment_line', [np.r_[a, b, tolerance]])
+            a, b, tolerance = line[0, :2], line[0, 2], line[0, 3]
 
             self.define_constraint(a[0]*position[0] + a[1]*position[1] - b - tolerance + rad[0], -inf, 0.)
             self.define_constraint(-a[0]*position[0] - a[1]*position[1] + b - tolerance + rad[0], -inf, 0.)
@@ -230,11 +233,13 @@ class Tool(Vehicle):
             # Todo: constraint imposes that the trajectory must lie inside the complete ring, not that it
             # may only lie inside the ring segment. Improve?
 
-            center = segment['pose']
+            ring = self.define_room_parameter('segment_ring', [np.r_[
+                segment['pose'][:2], segment['shape'].radius_in, segment['shape'].radius_out]])
+            center, radius_in, radius_out = ring[0, :2], ring[0, 2], ring[0, 3]
             self.define_constraint(-(position[0] - center[0])**2 - (position[1] - center[1])**2 +
-                                  (segment['shape'].radius_in + rad[0])**2, -inf, 0.)
+                                  (radius_in + rad[0])**2, -inf, 0.)
             self.define_constraint((position[0] - center[0])**2 + (position[1] - center[1])**2 -
-                                  (segment['shape'].radius_out - rad[0])**2, -inf, 0.)
+                                  (radius_out - rad[0])**2, -inf, 0.)
         else:
             raise RuntimeError('Invalid segment obtained when setting up collision avoidance constraints')
 
@@ -242,6 +247,8 @@ class Tool(Vehicle):
         if segment['start'][2] != segment['end'][2]:
             z_min = min(segment['start'][2],segment['end'][2])
             z_max = max(segment['start'][2],segment['end'][2])
+            z_lim = self.define_room_parameter('segment_z', [[z_min, z_max]])
+            z_min, z_max = z_lim[0, 0], z_lim[0, 1]
             # movement in z-direction
             self.define_constraint(-z + z_min - rad[0], -inf, 0.)
             self.define_constraint(z - z_max  - rad[0], -inf, 0.)
@@ -262,10 +269,11 @@ class Tool(Vehicle):
         # when using variable tolerances, explaining the if-check below.
 
         if self.options['variable_tolerance']:
-            self.define_constraint(position[0](1.) - segment['end'][0] - self.tolerance*0.9, -inf, 0.)
-            self.define_constraint(-position[0](1.) + segment['end'][0] - self.tolerance*0.9, -inf, 0.)
-            self.define_constraint(position[1](1.) - segment['end'][1] - self.tolerance*0.9, -inf, 0.)
-            self.define_constraint(-position[1](1.) + segment['end'][1] - self.tolerance*0.9, -inf, 0.)
+            end = self.define_room_parameter('segment_end', [segment['end'][:2]])
+            self.define_constraint(position[0](1.) - end[0, 0] - self.tolerance*0.9, -inf, 0.)
+            self.define_constraint(-position[0](1.) + end[0, 0] - self.tolerance*0.9, -inf, 0.)
+            self.define_constraint(position[1](1.) - end[0, 1] - self.tolerance*0.9, -inf, 0.)
+            self.define_constraint(-position[1](1.) + end[0, 1] - self.tolerance*0.9, -inf, 0.)
 
     def splines2signals(self, splines, time):
         signals = {}
@@ -273,12 +281,14 @@ class Tool(Vehicle):
         dx, dy, dz = x.derivative(), y.derivative(), z.derivative()
         ddx, ddy, ddz = x.derivative(2), y.derivative(2), z.derivative(2)
         dddx, dddy, dddz = x.derivative(3), y.derivative(3), z.derivative(3)
-        input = np.c_[sample_splines([dx, dy, dz], time)]
-        signals['state'] = np.c_[sample_splines([x, y, z], time)]
+        samples = sample_splines([x, y, z, dx, dy, dz, ddx, ddy, ddz,
+                                  dddx, dddy, dddz], time)
+        input = np.c_[samples[3:6]]
+        signals['state'] = np.c_[samples[0:3]]
         signals['input'] = input
         signals['v_tot'] = np.sqrt(input[0, :]**2 + input[1, :]**2 + input[2, :]**2)
-        signals['dinput'] = np.c_[sample_splines([ddx, ddy, ddz], time)]
-        signals['ddinput'] = np.c_[sample_splines([dddx, dddy, dddz], time)]
+        signals['dinput'] = np.c_[samples[6:9]]
+        signals['ddinput'] = np.c_[samples[9:12]]
         return signals
 
     def state2pose(self, state):
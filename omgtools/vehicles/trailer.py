@@ -172,8 +172,8 @@ class Trailer(Vehicle):
         signals = {}
         tg_ha_tr = splines[0]
         dtg_ha_tr = tg_ha_tr.derivative()
-        tg_ha_tr = np.array(sample_splines([tg_ha_tr], time))
-        dtg_ha_tr = np.array(sample_splines([dtg_ha_tr], time))
+        tg_ha_tr, dtg_ha_tr = [np.atleast_2d(s) for s in
+                               sample_splines([tg_ha_tr, dtg_ha_tr], time)]
         theta_tr = 2*np.arctan2(tg_ha_tr, 1)
         signals_veh = self.lead_veh.splines2signals(splines[1:], time)
         x_tr = signals_veh['state'][0, :] - self.l_hitch*np.cos(theta_tr)
@@ -59,6 +59,7 @@ class Vehicle(OptiChild, PlotLayer):
         # create default spline basis
         self.define_knots(knot_intervals=10)
         self.n_spl = n_spl
+        self.room_parameters = False
 
     # ========================================================================
     # Vehicle options
@@ -124,6 +125,7 @@ class Vehicle(OptiChild, PlotLayer):
         safety_weight = self.options['safety_weight']
         positions = [positions] if not isinstance(
             positions[0], list) else positions
+        room_par = {}
         for s, shape in enumerate(self.shapes):
             position = positions[s]
             checkpoints, rad = shape.get_checkpoints()
@@ -162,6 +164,10 @@ class Vehicle(OptiChild, PlotLayer):
                 lims = room['shape'].get_canvas_limits()
                 room_limits = []
                 room_limits += [lims[k]+room['position'][k] for k in range(self.n_dim)]
+                if 'limits' not in room_par:
+                    room_par['limits'] = self.define_room_parameter(
+                        'room_limits', room_limits)
+                room_limits = room_par['limits']
                 if ((isinstance(room['shape'], (Rectangle, Square)) and
                     room['shape'].orientation == 0.0) and
                     (isinstance(shape, Circle) or
@@ -170,20 +176,25 @@ class Vehicle(OptiChild, PlotLayer):
                     (isinstance(tg_ha, (int, float, long)) and tg_ha == 0.)):
                     for chck in checkpoints:
                         for k in range(self.n_dim):
-                            self.define_constraint(-(chck[k]+position[k]) + room_limits[k][0] + rad[0], -inf, 0.)
-                            self.define_constraint((chck[k]+position[k]) - room_limits[k][1] + rad[0], -inf, 0.)
+                            self.define_constraint(-(chck[k]+position[k]) + room_limits[k, 0] + rad[0], -inf, 0.)
+                            self.define_constraint((chck[k]+position[k]) - room_limits[k, 1] + rad[0], -inf, 0.)
                 else:
-                    hyp_room = room['shape'].get_hyperplanes(position = room['position'])
+                    if 'hyperplanes' not in room_par:
+                        hyp_room = room['shape'].get_hyperplanes(position = room['position'])
+                        room_par['hyperplanes'] = self.define_room_parameter(
+                            'room_hyperplanes', [np.r_[hpp['a'], hpp['b']] for hpp in hyp_room.itervalues()])
+                    hyp_room = room_par['hyperplanes']
                     for l, chck in enumerate(checkpoints):
-                        for hpp in hyp_room.itervalues():
+                        for h in range(hyp_room.shape[0]):
+                            a, b = hyp_room[h, :2], hyp_room[h, 2]
                             con = 0
-                            con += (hpp['a'][0]*chck[0] + hpp['a'][1]*chck[1])*(1.-tg_ha**2)
-                            con += (-hpp['a'][0]*chck[1] + hpp['a'][1]*chck[0])*(2*tg_ha)
+                            con += (a[0]*chck[0] + a[1]*chck[1])*(1.-tg_ha**2)
+                            con += (-a[0]*chck[1] + a[1]*chck[0])*(2*tg_ha)
                             pos = [0, 0]  # next part gives an offset to input position e.g. for trailer position
                             pos[0] = position[0]*(1+tg_ha**2) + offset*(1-tg_ha**2)  # = real_pos*(1+tg_ha**2)
                             pos[1] = position[1]*(1+tg_ha**2) + offset*(2*tg_ha)  # = real_pos*(1+tg_ha**2)
-                            con += (hpp['a'][0]*pos[0] + hpp['a'][1]*pos[1])
-                            con += (-hpp['b']+rad[l])*(1+tg_ha**2)
+                            con += (a[0]*pos[0] + a[1]*pos[1])
+                            con += (-b+rad[l])*(1+tg_ha**2)
                             self.define_constraint(con, -inf, 0)
 
     def define_collision_constraints_3d(self, hyperplanes, room, positions, horizon_time):
@@ -193,6 +204,7 @@ class Vehicle(OptiChild, PlotLayer):
         safety_weight = self.options['safety_weight']
         positions = [positions] if not isinstance(
             positions[0], list) else positions
+        room_par = {}
         for s, shape in enumerate(self.shapes):
             position = positions[s]
             checkpoints, rad = shape.get_checkpoints()
@@ -221,12 +233,26 @@ class Vehicle(OptiChild, PlotLayer):
                 lims = room['shape'].get_canvas_limits()
                 room_limits = []
                 room_limits += [lims[k]+room['position'][k] for k in range(self.n_dim)]
+                if 'limits' not in room_par:
+                    room_par['limits'] = self.define_room_parameter(
+                        'room_limits', room_limits)
+                room_limits = room_par['limits']
                 for chck in checkpoints:
                     for k in range(3):
                         self.define_constraint(-
-                                               (chck[k]+position[k]) + room_limits[k][0], -inf, 0.)
+                                               (chck[k]+position[k]) + room_limits[k, 0], -inf, 0.)
                         self.define_constraint(
-                            (chck[k]+position[k]) - room_limits[k][1], -inf, 0.)
+                            (chck[k]+position[k]) - room_limits[k, 1], -inf, 0.)
+
+    def define_room_parameter(self, name, value):
+        # with solver reuse (see Problem.init), room geometry enters as
+        # parameter, such that problems in rooms with the same layout share
+        # their nlp structure. Otherwise it is a constant.
+        value = np.array(value, dtype=float)
+        if not self.room_parameters:
+            return value
+        name += str(len([par for par in self._parameters if par.startswith(name)]))
+        return self.define_parameter(name, value.shape[0], value.shape[1], value=value)
 
     def get_fleet_center(self, splines, rel_pos, substitute=True):
         if substitute:
@@ -254,7 +280,7 @@ class Vehicle(OptiChild, PlotLayer):
             n_insert = None
 
          # save individual spline segments
-        self.result_spline_segments = np.array(spline_segments)
+        self.result_spline_segments = spline_segments
 
         splines = concat_splines(spline_segments, segment_times, n_insert=n_insert)
 
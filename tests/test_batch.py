@@ -0,0 +1,28 @@
+import numpy as np
+from omgtools import *
+
+
+def test_batch_order():
+    # every job starts from the state of the problem at the call, so the
+    # results do not depend on the order of the jobs or the processes
+    vehicle = Holonomic()
+    vehicle.set_initial_conditions([-1.5, -1.5])
+    vehicle.set_terminal_conditions([2., 2.])
+    environment = Environment(room={'shape': Square(5.)})
+    environment.add_obstacle(Obstacle({'position': [1.5, -1.]},
+                                      shape=Circle(0.5)))
+    problem = Point2point(vehicle, environment, freeT=False)
+    problem.set_options({'verbose': 0})
+    problem.init()
+    a = ([-1.5, -1.5], [2., 2.])
+    b = ([-1.5, -1.5], [2., 2.], [{'position': [0.5, 0.]}])
+    ref = solve_batch(problem, [a, b], processes=1)
+    for results in [solve_batch(problem, [b, a], processes=1)[::-1],
+                    solve_batch(problem, [b, a, b, a], processes=2)[2:][::-1]]:
+        for result, expected in zip(results, ref):
+            assert np.allclose(result['trajectories']['state'],
+                               expected['trajectories']['state'])
+    # the problem of the caller is left unchanged
+    assert np.allclose(environment.obstacles[0].signals['position'].ravel(),
+                       [1.5, -1.])
+    assert np.allclose(vehicle.prediction['state'], [-1.5, -1.5])
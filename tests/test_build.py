@@ -0,0 +1,35 @@
+import os
+import shutil
+import tempfile
+from casadi import MX, Function, external
+from omgtools.basics.optilayer import generate_source, compile_units, compile_flags
+
+
+def test_compile_units():
+    # units are compiled separately and only again when they change
+    x = MX.sym('x')
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'fun')
+        units = [('fun_a', generate_source('fun_a', Function('fun_a', [x], [2*x]))),
+                 ('fun_b', generate_source('fun_b', Function('fun_b', [x], [x*x])))]
+        compile_units(path, units, '-O0', jobs=2)
+        assert float(external('fun_a', path+'.so')(3.)) == 6.
+        assert float(external('fun_b', path+'.so')(3.)) == 9.
+        objects = [os.path.join(path+'_units', unit+'.o') for unit, _ in units]
+        times = [os.path.getmtime(obj) for obj in objects + [path+'.so']]
+        compile_units(path, units, '-O0', jobs=2)
+        assert [os.path.getmtime(obj) for obj in objects + [path+'.so']] == times
+        units[1] = ('fun_b', generate_source('fun_b', Function('fun_b', [x], [x+1])))
+        compile_units(path, units, '-O0', jobs=2)
+        assert os.path.getmtime(objects[0]) == times[0]
+        assert os.path.getmtime(objects[1]) != times[1]
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_compile_flags():
+    codegen = {'flags': '-O0', 'function_flags': {'nlp': '-O3', 'upd_z': '-O1'}}
+    assert compile_flags(codegen, 'nlp') == '-O3'
+    assert compile_flags(codegen, 'upd_z_2') == '-O1'
+    assert compile_flags(codegen, 'upd_x') == '-O0'
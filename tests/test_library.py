@@ -0,0 +1,45 @@
+import os
+import shutil
+import tempfile
+import numpy as np
+from omgtools import *
+
+
+def test_library_round_trip():
+    directory = tempfile.mkdtemp()
+    try:
+        for format in SolutionLibrary.formats:
+            library = SolutionLibrary(format=format)
+            library.add([0., 0.], [1., 2., 3.], [4.], [5., 6., 7.])
+            library.add([1., 0.], [7., 8., 9.])  # without duals
+            path = os.path.join(directory, 'library.' + format)
+            library.save(path)
+            loaded = SolutionLibrary(path, format=format)
+            assert len(loaded) == 2
+            for features in [[0.1, 0.], [0.9, 0.2]]:
+                expected, solution = library.query(features), loaded.query(features)
+                assert np.isclose(solution['distance'], expected['distance'])
+                for key in ['variables', 'duals', 'bound_duals']:
+                    if expected[key] is None:
+                        assert solution[key] is None
+                    else:
+                        assert np.allclose(solution[key], expected[key])
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_library_query():
+    library = SolutionLibrary(max_distance=0.5, max_size=2)
+    assert library.query([0., 0.]) is None
+    for k in range(3):
+        library.add([float(k), 0.], [float(k)])
+    # the oldest solution is forgotten
+    assert len(library) == 2
+    assert np.allclose(library.query([0.8, 0.])['variables'], [1.])
+    assert library.query([5., 0.]) is None
+    try:
+        library.add([0., 0.], [1., 2.])
+    except ValueError:
+        pass
+    else:
+        assert False
@@ -0,0 +1,23 @@
+from omgtools import *
+from casadi import Function
+
+
+def test_substitution():
+    # after construction, the nlp only depends on the stacked variables and
+    # parameters: all symbols and substitutes of the children are replaced
+    vehicle = Holonomic()
+    vehicle.set_options({'safety_distance': 0.1})
+    vehicle.set_initial_conditions([-1.5, -1.5])
+    vehicle.set_terminal_conditions([2., 2.])
+    environment = Environment(room={'shape': Square(5.)})
+    environment.add_obstacle(Obstacle({'position': [1.5, -1.]},
+                                      shape=Circle(0.5)))
+    problem = Point2point(vehicle, environment, freeT=True)
+    problem.set_options({'verbose': 0})
+    problem.init()
+    description = problem.father.problem_description
+    nlp = Function('nlp', [description['var'], description['par']],
+                   [description['con'], description['obj']])
+    assert not nlp.has_free()
+    assert problem.father.construct_times.keys()[:4] == [
+        'symbols', 'structs', 'substitution', 'substitutes']
@@ -0,0 +1,68 @@
+import numpy as np
+from omgtools.basics.spline import BSplineBasis, BSpline, SplineSet, TensorBSpline
+from omgtools.basics.spline_extra import spline_roots, spline_extrema
+
+
+def identity(degree, n_knots):
+    # the spline x on [0, 1]
+    knots = np.r_[np.zeros(degree), np.linspace(0., 1., n_knots),
+                  np.ones(degree)]
+    basis = BSplineBasis(knots, degree)
+    return BSpline(basis, np.array(basis.greville()))
+
+
+def test_roots():
+    for degree, n_knots in [(2, 6), (3, 9), (3, 10)]:
+        x = identity(degree, n_knots)
+        # simple roots, on a knot or not
+        assert np.allclose(((x-0.25)*(x-0.6)).roots(), [0.25, 0.6])
+        assert np.allclose(((x-0.3)*(x-0.55)).roots(), [0.3, 0.55])
+        # a tangential root is reported once
+        for root in [0.5, 0.45]:
+            assert np.allclose(((x-root)*(x-root)).roots(), [root],
+                               atol=1e-6)
+        # no roots for a positive spline
+        assert len(((x-0.5)*(x-0.5) + 1e-6).roots()) == 0
+        # several splines at once
+        roots = spline_roots([x-0.2, (x-0.45)*(x-0.45), x+1.])
+        assert np.allclose(roots[0], [0.2])
+        assert np.allclose(roots[1], [0.45], atol=1e-6)
+        assert len(roots[2]) == 0
+
+
+def test_extrema():
+    x = identity(3, 10)
+    t_min, v_min, t_max, v_max = spline_extrema((x-0.45)*(x-0.45))
+    assert np.allclose([t_min, v_min, t_max, v_max], [0.45, 0., 1., 0.3025])
+    t_min, v_min, t_max, v_max = spline_extrema([x*(1.-x), -x], 0.1, 0.8)
+    assert np.allclose(t_min, [0.1, 0.8]) and np.allclose(v_min, [0.09, -0.8])
+    assert np.allclose(t_max, [0.5, 0.1]) and np.allclose(v_max, [0.25, -0.1])
+
+
+def test_spline_set():
+    x = identity(3, 10)
+    splines = [x, 1.-x, 2.*x+1.]
+    spline_set = SplineSet(x.basis, np.column_stack([s.coeffs for s in splines]))
+    t = np.linspace(0., 1., 7)
+    assert len(spline_set) == 3
+    assert np.allclose(spline_set(t), np.column_stack([s(t) for s in splines]))
+    assert np.allclose(spline_set.derivative()(t), [[1., -1., 2.]]*len(t))
+    assert np.allclose(spline_set.integral(), [0.5, 0.5, 2.])
+    assert np.allclose(spline_set[1:](t), np.column_stack([1.-t, 2.*t+1.]))
+    assert np.allclose(np.ravel([s(0.3) for s in spline_set]), [0.3, 0.7, 1.6])
+
+
+def test_tensor_spline():
+    x, y = identity(3, 8), identity(2, 6)
+    # f = x*y and g = x + y
+    f = TensorBSpline([x.basis, y.basis], np.outer(x.coeffs, y.coeffs), ['x', 'y'])
+    g = TensorBSpline([y.basis, x.basis],
+                      np.add.outer(y.coeffs, x.coeffs), ['x', 'y'])
+    tx, ty = np.linspace(0., 1., 5), np.linspace(0., 1., 4)
+    assert np.allclose(f([tx, ty]), np.outer(tx, ty))
+    px, py = np.array([0.1, 0.5, 0.95]), np.array([0.7, 0.2, 1.])
+    assert np.allclose(f.eval_points([px, py]), px*py)
+    assert np.allclose((f*f).eval_points([px, py]), (px*py)**2)
+    assert np.allclose((f+g)([tx, ty]), np.outer(tx, ty) + np.add.outer(tx, ty))
+    assert np.allclose((f-2.*f).eval_points([px, py]), -px*py)
+    assert np.isclose(f.integral(), 0.25)